@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import re
+import glob
+import time
+import traceback
+import multiprocessing
+from multiprocessing.util import Finalize
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sideInputs import analyze_path, option_value, simCache, misTable, sessionPool, simProfile, print_profile, cacheDir, cacheMB, \
+    parse_corners, corner_name, corner_envelope, pathOptions, path_options
+
+# ngspice slots shared by every worker process, and the worker's own warm sessions, set by init_worker
+simSlots = None
+sessions = None
+
+def init_worker(slots, sessionCount):
+    global simSlots, sessions
+    simSlots = slots
+    if sessionCount:
+        # Sessions outlive a single path, every path the worker analyzes reuses them. Pool workers
+        # leave through os._exit, which skips atexit, multiprocessing's finalizers still run
+        sessions = sessionPool(sessionCount)
+        Finalize(None, sessions.close, exitpriority=10)
+
+def path_index(subcktFile):
+    match = re.search(r'path_(\d+)\.sp$', subcktFile)
+    return int(match.group(1)) if match else -1
+
+def collect_paths(sources):
+    # Directories contribute their path_N.sp netlists, anything else is a file or a glob
+    subcktFiles = []
+    for source in sources:
+        if os.path.isdir(source):
+            subcktFiles.extend(glob.glob(os.path.join(source, "path_*.sp")))
+        else:
+            subcktFiles.extend(glob.glob(source))
+    # Leave out the testbenches sideInputs.py writes next to each path
+    subcktFiles = [f for f in set(subcktFiles) if path_index(f) >= 0 or not re.search(r'_(?:SIS|MIS)_', f)]
+    return sorted(subcktFiles, key=lambda f: (path_index(f), f))
+
+def read_arrival_windows(summaryFile):
+    # First arrival time of every path in path_extraction.tcl's arrival_windows.txt
+    startingOffsets = {}
+    pathNum = None
+    with open(summaryFile) as f:
+        for line in f:
+            pathMatch = re.match(r'\s*Path (\d+):', line)
+            if pathMatch:
+                pathNum = int(pathMatch.group(1))
+                continue
+            if pathNum is not None and pathNum not in startingOffsets and "Arrival Time:" in line:
+                number = re.search(r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?', line.split("Arrival Time:")[1])
+                if number:
+                    startingOffsets[pathNum] = float(number.group(0))
+    return startingOffsets
+
+def writer_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def manifest_writer(manifestFile):
+    # Process id the extractor lists on the manifest's first line, None before it is written
+    try:
+        with open(manifestFile) as f:
+            tokens = f.readline().split()
+    except OSError:
+        return None
+    return int(tokens[1]) if len(tokens) == 2 and tokens[0] == "pid" and tokens[1].isdigit() else None
+
+def follow_manifest(manifestFile, poll=0.2, timeout=600.0):
+    # Tail path_extraction.tcl's manifest, yielding each path and its first arrival as soon as its
+    # line is complete, until the extractor writes "end". A manifest whose writer has exited is left
+    # over from an earlier run and waited out until the extractor rewrites it. Raises RuntimeError
+    # when the writer exits without "end" or nothing new arrives for timeout seconds (0 never)
+    idleSince = time.time()
+    def idle(what):
+        if timeout and time.time() - idleSince > timeout:
+            raise RuntimeError(f"{what} for {timeout:g} s")
+        time.sleep(poll)
+
+    pid = manifest_writer(manifestFile)
+    while pid is None or not writer_alive(pid):
+        idle(f"No running extractor wrote {manifestFile}")
+        pid = manifest_writer(manifestFile)
+    manifestDir = os.path.dirname(manifestFile)
+    with open(manifestFile) as f:
+        line = ""
+        while True:
+            line += f.readline()
+            if not line.endswith("\n"):
+                # Nothing new or half a line, STA is still writing
+                if not writer_alive(pid):
+                    raise RuntimeError(f"Extractor {pid} exited before finishing {manifestFile}")
+                idle(f"Nothing new in {manifestFile}")
+                continue
+            idleSince = time.time()
+            tokens = line.split()
+            line = ""
+            if tokens == ["end"]:
+                return
+            if len(tokens) < 2 or tokens[0] == "pid":
+                continue
+            number = re.search(r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?', " ".join(tokens[2:]))
+            yield os.path.join(manifestDir, tokens[1]), float(number.group(0)) if number else 0.0
+
+def analyze_one(subcktFile, startingOffset, jobs, verbose, cacheSettings, modes, profiling=False, tableDir=None, corner=None):
+    # Each path and corner reports to its own file so concurrent analyses don't interleave on the console
+    reportFile = os.path.splitext(subcktFile)[0] + ("_" + corner_name(corner) if corner else "") + "_report.txt"
+    # The path's trace goes back to the main process, which writes one file for the batch
+    profile = simProfile() if profiling else None
+    with open(reportFile, "w") as f, redirect_stdout(f):
+        try:
+            cache = simCache(*cacheSettings) if cacheSettings else None
+            tables = misTable(tableDir) if tableDir else None
+            result = analyze_path(subcktFile, startingOffset, verbose=verbose, jobs=jobs, simSlots=simSlots, cache=cache,
+                                  sessions=sessions, profile=profile, tables=tables, corner=corner, **modes)
+        except Exception as e:
+            traceback.print_exc(file=f)
+            result = {"path": subcktFile, "corner": corner_name(corner) if corner else None, "error": f"{type(e).__name__}: {e}"}
+    result["report"] = reportFile
+    if profile:
+        result["profile"] = profile.export()
+    return result
+
+def print_rows(header, rows, out):
+    widths = [max(len(row[col]) for row in [header] + rows) for col in range(len(header))]
+    for row in [header, ["-" * w for w in widths]] + rows:
+        print("  ".join(cell.ljust(w) for cell, w in zip(row, widths)).rstrip(), file=out)
+
+def print_table(results, out=sys.stdout):
+    header = ["Path", "Stages", "Side inputs", "SIS (ps)", "Speed-up (ps)", "Slow-down (ps)", "AT window (ns)"]
+    # A corner sweep lists every corner of a path under the path
+    corners = any(result.get("corner") for result in results)
+    if corners:
+        header.insert(1, "Corner")
+    rows = []
+    for result in results:
+        name = os.path.basename(result["path"])
+        if corners:
+            name = [name, result.get("corner") or "-"]
+        else:
+            name = [name]
+        if "error" in result:
+            rows.append(name + ["-", "-", "-", "-", "-", "ERROR " + result["error"]])
+        elif result["atWindow"] is None:
+            rows.append(name + [str(result["stages"]), str(result["sideInputs"]),
+                         f"{result['originalAT'] * 1e12:.3f}" if result["originalAT"] is not None else "-",
+                         "-", "-", "no side inputs"])
+        else:
+            rows.append(name + [str(result["stages"]), str(result["sideInputs"]),
+                         f"{result['originalAT'] * 1e12:.3f}",
+                         f"{result['speedup']:.3f}", f"{result['slowdown']:.3f}",
+                         f"{result['atWindow'][0]:.3f} - {result['atWindow'][1]:.3f}"])
+    print_rows(header, rows, out)
+
+def print_envelopes(results, out=sys.stdout):
+    # Every path's AT window enveloped over its corners
+    header = ["Path", "Corners", "AT window (ns)", "Earliest", "Latest"]
+    rows = []
+    for subcktFile in dict.fromkeys(result["path"] for result in results):
+        pathResults = [result for result in results if result["path"] == subcktFile]
+        envelope = corner_envelope(pathResults)
+        if envelope:
+            rows.append([os.path.basename(subcktFile), str(len(pathResults)), f"{envelope[0]:.3f} - {envelope[1]:.3f}",
+                         envelope[2], envelope[3]])
+        else:
+            rows.append([os.path.basename(subcktFile), str(len(pathResults)), "no side inputs", "-", "-"])
+    print_rows(header, rows, out)
+
+def main():
+    valueOptions = ("--jobs", "--paths", "--so", "--windows", "--table", "--cache", "--cache-size", "--profile", "--profile-top",
+                    "--mis-tables", "--follow", "--follow-timeout", "--corners") + tuple(flag for flag, name, cast in pathOptions if cast)
+    sources = [arg for idx, arg in enumerate(sys.argv[1:], start=1)
+               if not arg.startswith("--") and not sys.argv[idx - 1] in valueOptions]
+    followFile = option_value("--follow", None, str)
+    if not sources and not followFile:
+        print("Usage: batchPaths.py <dir|glob|file>... | --follow manifest [--follow-timeout s] [--jobs N] [--paths P] [--so ns] [--windows file] [--table file]"
+              " [--cache dir] [--cache-size MB] [--no-cache] [--sessions] [--sweep] [--replay] [--replay-check] [--raw] [--profile file] [--profile-top N] [--prune K] [--prune-margin ps] [--prune-check] [--mis-tables dir] [--skew-window ps] [--skew-budget N]"
+              " [--adaptive] [--adaptive-margin ps] [--adaptive-check] [--adaptive-tol ps] [--scratch dir] [--corners lib[:vdd[:temp]],...] [--subsets N] [--subset-beam W]"
+              " [--sim-timeout s] [--sim-retries N] [--v]")
+        sys.exit(1)
+
+    verbose = "--v" in sys.argv
+    # Total ngspice processes across all paths, and paths analyzed at once
+    jobs = option_value("--jobs", 0, int) or os.cpu_count()
+    # Every path is analyzed at each corner, all corners share the pool and ngspice slots
+    corners = parse_corners(option_value("--corners", None, str)) if "--corners" in sys.argv else [None]
+    cornerOrder = {corner_name(corner) if corner else None: idx for idx, corner in enumerate(corners)}
+
+    # Starting offsets come from --so, else from the STA arrival windows next to the paths
+    startingOffset = option_value("--so", None, float)
+    if followFile:
+        # Paths arrive while STA is still extracting, each with its first arrival
+        subcktFiles = []
+        startingOffsets = {}
+        paths = option_value("--paths", 0, int) or jobs
+    else:
+        subcktFiles = collect_paths(sources)
+        if not subcktFiles:
+            print("No path netlists found")
+            sys.exit(1)
+        paths = option_value("--paths", 0, int) or min(len(subcktFiles) * len(corners), jobs)
+        windowsFile = option_value("--windows", os.path.join(os.path.dirname(subcktFiles[0]), "arrival_windows.txt"), str)
+        startingOffsets = read_arrival_windows(windowsFile) if startingOffset is None and os.path.exists(windowsFile) else {}
+
+    cacheSettings = None
+    if "--no-cache" not in sys.argv:
+        cacheSettings = (option_value("--cache", cacheDir, str), option_value("--cache-size", cacheMB, float) * 1e6)
+
+    # Analysis modes passed straight through to analyze_path
+    modes = path_options()
+
+    traceFile = option_value("--profile", None, str)
+    # Every path reads and extends the same MIS tables
+    tableDir = option_value("--mis-tables", None, str)
+
+    if followFile:
+        print(f"Analyzing the paths listed in {followFile} as they are extracted, {paths} at a time, with up to {jobs} ngspice processes")
+    else:
+        print(f"Analyzing {len(subcktFiles)} paths" + (f" at {len(corners)} corners" if corners[0] else "")
+              + f", {paths} at a time, with up to {jobs} ngspice processes")
+    # Each path may use every slot while the others are between simulations
+    slots = multiprocessing.BoundedSemaphore(jobs)
+    results = []
+    followError = None
+    # Workers split the --jobs budget of resident sessions between them
+    sessionCount = -(-jobs // paths) if "--sessions" in sys.argv else 0
+    with ProcessPoolExecutor(max_workers=paths, initializer=init_worker,
+                             initargs=(slots, sessionCount)) as pool:
+        futures = {}
+        def submit(subcktFile, firstArrival):
+            for corner in corners:
+                futures[pool.submit(analyze_one, subcktFile, startingOffset if startingOffset is not None else firstArrival,
+                                    jobs, verbose, cacheSettings, modes, traceFile is not None, tableDir, corner)] = \
+                    subcktFile + (" at " + corner_name(corner) if corner else "")
+        if followFile:
+            # Workers start on the first paths while the manifest is still growing, paths queued
+            # before the extractor died or stalled are still analyzed
+            try:
+                for subcktFile, firstArrival in follow_manifest(followFile, timeout=option_value("--follow-timeout", 600.0, float)):
+                    subcktFiles.append(subcktFile)
+                    submit(subcktFile, firstArrival)
+                    print(f"Queued {subcktFile}")
+            except RuntimeError as e:
+                followError = e
+                print(f"Error: {e}")
+        else:
+            for subcktFile in subcktFiles:
+                submit(subcktFile, startingOffsets.get(path_index(subcktFile), 0.0))
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            status = "failed, see " + result["report"] if "error" in result else "done"
+            print(f"[{done}/{len(futures)}] {futures[future]} {status}")
+
+    results.sort(key=lambda result: (path_index(result["path"]), result["path"], cornerOrder.get(result.get("corner"), 0)))
+    print()
+    print_table(results)
+    if corners[0]:
+        print()
+        print_envelopes(results)
+    if cacheSettings:
+        hits = sum(result.get("cacheHits", 0) for result in results)
+        misses = sum(result.get("cacheMisses", 0) for result in results)
+        print(f"Simulation cache: {hits} hits, {misses} misses")
+    if modes["prune"]:
+        skipped = sum(result.get("simsPruned", 0) for result in results)
+        coarse = sum(result.get("coarseSims", 0) for result in results)
+        print(f"Pruning: {skipped} side-input simulations skipped for {coarse} coarse ones"
+              + (f", {sum(result.get('pruneMisses', 0) for result in results)} missed winners" if modes["pruneCheck"] else ""))
+    if modes["adaptiveCheck"]:
+        errors = [result["adaptiveError"] for result in results if result.get("adaptiveError") is not None]
+        if errors:
+            print(f"Adaptive check: largest deviation from the fixed-step run {max(errors) * 1e12:.3f} ps")
+    if modes["subsets"]:
+        print(f"Subset search: {sum(result.get('subsetSims', 0) for result in results)} subsets simulated, "
+              f"{sum(result.get('subsetWins', 0) for result in results)} worst cases from a subset")
+    if tableDir:
+        hits = sum(result.get("tableHits", 0) for result in results)
+        points = sum(result.get("tablePoints", 0) for result in results)
+        print(f"MIS tables: {hits} side inputs answered, {points} points added")
+    retries = sum(result.get("simRetries", 0) for result in results)
+    failures = [(result, failure) for result in results for failure in result.get("simFailures", [])]
+    if retries or failures:
+        print(f"Simulation failures: {retries} retries, {len(failures)} decks failed every retry")
+        for result, failure in failures:
+            print(f"  {os.path.basename(result['path'])}" + (f" at {result['corner']}" if result.get("corner") else "") + f": {failure}")
+    if traceFile:
+        profile = simProfile()
+        for result in results:
+            if "profile" in result:
+                profile.merge(result["profile"])
+        print_profile(profile.write(traceFile, option_value("--profile-top", 10, int)), traceFile)
+    tableFile = option_value("--table", None, str)
+    if tableFile:
+        with open(tableFile, "w") as f:
+            print_table(results, f)
+            if corners[0]:
+                print(file=f)
+                print_envelopes(results, f)
+    if followError:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
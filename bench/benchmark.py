@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import functools
+import threading
+from contextlib import redirect_stdout
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchDir))
+import sideInputs
+from sideInputs import analyze_path, option_value, path_options, simCache, sessionPool, misTable
+from genPaths import write_paths
+
+# Scaling benchmark of sideInputs.py on synthetic paths and the stand-in ngspice in this directory.
+# Every stage count x fanin pair is analyzed in a fresh directory; the analysis phases are timed by
+# wrapping the sideInputs functions that implement them
+
+phaseFunctions = {
+    "build":    ["render_testbench"],
+    "write":    ["write_sim"],
+    "simulate": ["run_sim"],
+    "parse":    ["parse_log", "parse_raw"],
+}
+
+class phaseTimer:
+    # Summed seconds and calls per phase, and bytes of the decks, logs and rawfiles written wherever
+    # the workspace put them. Simulations run on worker threads, so the summed simulate cost exceeds
+    # wall time when --jobs > 1
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seconds = {phase: 0.0 for phase in phaseFunctions}
+        self.calls = {phase: 0 for phase in phaseFunctions}
+        self.bytes = 0
+
+    def wrap(self, phase, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.seconds[phase] += time.perf_counter() - start
+                    self.calls[phase] += 1
+        return timed
+
+    def count(self, function, outputs):
+        # outputs(args, result) names the files a call wrote, their sizes are added once it returns
+        @functools.wraps(function)
+        def counted(*args, **kwargs):
+            result = function(*args, **kwargs)
+            size = sum(os.path.getsize(name) for name in outputs(args, result) if os.path.exists(name))
+            with self.lock:
+                self.bytes += size
+            return result
+        return counted
+
+    def install(self):
+        # sideInputs looks its functions up as module globals, so replacing them times every call
+        for phase, names in phaseFunctions.items():
+            for name in names:
+                setattr(sideInputs, name, self.wrap(phase, getattr(sideInputs, name)))
+        # Scratch files are gone once the analysis ends, so they are sized as they are written
+        sideInputs.write_sim = self.count(sideInputs.write_sim, lambda args, result: result[:1])
+        sideInputs.run_sim = self.count(sideInputs.run_sim, lambda args, result: [args[2], sideInputs.raw_file_of(args[2])])
+
+def bytes_kept(workDir, inputs):
+    return sum(os.path.getsize(os.path.join(workDir, name)) for name in os.listdir(workDir)
+               if os.path.join(workDir, name) not in inputs)
+
+def run_case(timer, stages, fanin, rc, jobs, repeat, modes, cache, sessions, tables, keep):
+    workDir = tempfile.mkdtemp(prefix="bench_%ds_%df_" % (stages, fanin))
+    subcktFile = write_paths(workDir, 1, stages, fanin, rc)[0]
+    inputs = {os.path.join(workDir, name) for name in os.listdir(workDir)}
+    rows = []
+    for run in range(repeat):
+        timer.reset()
+        start = time.perf_counter()
+        with open(os.path.join(workDir, "report_%d.txt" % run), "w") as report, redirect_stdout(report):
+            result = analyze_path(subcktFile, 0.0, jobs=jobs, cache=cache, sessions=sessions, tables=tables, **modes)
+        wall = time.perf_counter() - start
+        inputs.add(os.path.join(workDir, "report_%d.txt" % run))
+        rows.append({
+            "stages":     stages,
+            "fanin":      fanin,
+            "sideInputs": result["sideInputs"],
+            "run":        run,
+            "wall":       wall,
+            "sims":       timer.calls["simulate"],
+            "bytes":      timer.bytes,
+            "keptBytes":  bytes_kept(workDir, inputs),
+            "netlistBytes": os.path.getsize(subcktFile),
+            "cacheHits":  result["cacheHits"],
+            "tableHits":  result["tableHits"],
+            "phases":     dict(timer.seconds),
+        })
+    if keep:
+        print("Kept " + workDir)
+    else:
+        shutil.rmtree(workDir)
+    return rows
+
+def print_rows(rows, out=sys.stdout):
+    header = ["Stages", "Fanin", "Side inputs", "Run", "Wall (s)", "Sims", "Written (kB)", "Kept (kB)", "Cache hits"] + \
+             [phase.capitalize() + " (s)" for phase in phaseFunctions]
+    table = [[str(row["stages"]), str(row["fanin"]), str(row["sideInputs"]), str(row["run"]), f"{row['wall']:.3f}",
+              str(row["sims"]), f"{row['bytes'] / 1e3:.1f}", f"{row['keptBytes'] / 1e3:.1f}", str(row["cacheHits"])] +
+             [f"{row['phases'][phase]:.3f}" for phase in phaseFunctions] for row in rows]
+    widths = [max(len(line[col]) for line in [header] + table) for col in range(len(header))]
+    for line in [header, ["-" * w for w in widths]] + table:
+        print("  ".join(cell.ljust(w) for cell, w in zip(line, widths)).rstrip(), file=out)
+
+def main():
+    if "--help" in sys.argv:
+        print("Usage: benchmark.py [--stages 4,8,16] [--fanin 2,3,4] [--rc N] [--latency s] [--stage-latency s]"
+              " [--jobs N] [--repeat N] [--json file] [--cache dir] [--sessions] [--sweep] [--replay] [--raw] [--prune K] [--mis-tables dir] [--skew-window ps] [--adaptive] [--subsets N]"
+              " [--step-latency s] [--keep], and every other sideInputs.py analysis mode")
+        sys.exit()
+
+    stageCounts = [int(n) for n in option_value("--stages", "4,8,16", str).split(",")]
+    fanins = [int(n) for n in option_value("--fanin", "2,3,4", str).split(",")]
+    rc = option_value("--rc", 0, int)
+    jobs = option_value("--jobs", 1, int) or os.cpu_count()
+    repeat = option_value("--repeat", 1, int)
+
+    # The stand-in ngspice answers every simulation of the run
+    os.environ["PATH"] = benchDir + os.pathsep + os.environ["PATH"]
+    os.environ["NGSPICE_BENCH_LATENCY"] = str(option_value("--latency", 0.0, float))
+    os.environ["NGSPICE_BENCH_STAGE_LATENCY"] = str(option_value("--stage-latency", 0.0, float))
+    os.environ["NGSPICE_BENCH_STEP_LATENCY"] = str(option_value("--step-latency", 0.0, float))
+    sideInputs.ngspice_version.cache_clear()
+
+    # Benchmarks start cold unless a cache directory is given, --repeat then shows warm runs
+    cacheDir = option_value("--cache", None, str)
+    cache = simCache(cacheDir, sideInputs.cacheMB * 1e6) if cacheDir else None
+    sessions = sessionPool(jobs) if "--sessions" in sys.argv else None
+    # Like the cache, tables filled by one case answer the next
+    tableDir = option_value("--mis-tables", None, str)
+    tables = misTable(tableDir) if tableDir else None
+    modes = path_options()
+
+    timer = phaseTimer()
+    timer.install()
+    rows = []
+    try:
+        for stages in stageCounts:
+            for fanin in fanins:
+                rows.extend(run_case(timer, stages, fanin, rc, jobs, repeat, modes, cache, sessions, tables, "--keep" in sys.argv))
+                print(f"{stages} stages, fanin {fanin}: {rows[-1]['wall']:.3f} s, {rows[-1]['sims']} sims")
+    finally:
+        if sessions:
+            sessions.close()
+
+    print()
+    print_rows(rows)
+    jsonFile = option_value("--json", None, str)
+    if jsonFile:
+        with open(jsonFile, "w") as f:
+            json.dump({"argv": sys.argv[1:], "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sideInputs import option_value
+
+# Synthetic path netlists in the format write_path_spice produces, for running sideInputs.py and
+# batchPaths.py against the stand-in ngspice in this directory
+
+def gen_path(pathNum, stages, fanin, rc=0, seed=1):
+    rnd = random.Random(seed * 1000 + pathNum)
+    vdd = 1.8
+    tmax = stages * 1e-10 + 2e-10
+    gates = ["u%d" % s for s in range(1, stages)]
+    # Stage s > 1 is gate u(s-1), driving the next gate's A pin or the endpoint
+    loads = ["%s/A" % gate for gate in gates[1:]] + ["r1/D"]
+
+    lines = []
+    lines.append("* Path from in ^ to r1/D ^\n")
+    lines.append('.include "/pdk/sky130A/libs.tech/ngspice/sky130.lib.spice"\n')
+    # Like write_path_spice, every deck includes path_1.subckt whatever the path
+    lines.append('.include "path_1.subckt"\n')
+    lines.append("\n")
+    lines.append(".tran 1e-13 %.3e\n\n" % tmax)
+    lines.append(".print tran v(in) " + " ".join("v(%s/Y)" % gate for gate in gates) + " v(r1/D)\n\n")
+
+    lines.append("xstage1 in u1/A stage1\n")
+    for s, (gate, load) in enumerate(zip(gates, loads), start=2):
+        lines.append("xstage%d %s/A %s/Y %s stage%d\n" % (s, gate, gate, load, s))
+    lines.append("\nv1 in 0 pwl(\n+0.000e+00 0.000e+00\n+5.000e-11 %.3e\n+%.3e %.3e\n+)\n\n" % (vdd, tmax, vdd))
+
+    lines.append(".subckt stage1 in u1/A\nR1 in u1/A 10\nC1 u1/A 0 1e-15\n.ends\n\n")
+    for s, (gate, load) in enumerate(zip(gates, loads), start=2):
+        # Alternate nand and nor so side inputs sit at both sensitizing values
+        nand = s % 2 == 0
+        sides = ["%s/%s" % (gate, pin) for pin in "BCDEFGH"[:fanin - 1]]
+        cell = ("sky130_fd_sc_hd__nand%d_1" if nand else "sky130_fd_sc_hd__nor%d_1") % fanin
+        lines.append(".subckt stage%d %s/A %s/Y %s\n" % (s, gate, gate, load))
+        lines.append("* Gate %s A -> Y\n" % gate)
+        lines.append("x%s %s/A %s %s/VGND %s/VNB %s/VPB %s/VPWR %s/Y %s\n"
+                     % (gate, gate, " ".join(sides), gate, gate, gate, gate, gate, cell))
+        source = 1
+        for side in sides:
+            lines.append("v%d %s 0 %.3f\n" % (source, side, vdd if nand else 0.0))
+            source += 1
+        for pin, volts in (("VGND", 0.0), ("VNB", 0.0), ("VPB", vdd), ("VPWR", vdd)):
+            lines.append("v%d %s/%s 0 %.3f\n" % (source, gate, pin, volts))
+            source += 1
+        lines.append("\n* Load pins\n")
+        lines.append("C1 %s 0 %.2e\n" % (load, rnd.uniform(1e-15, 3e-15)))
+        lines.append("* Net %s/Y\n" % gate)
+        # rc extra parasitic segments per net, to grow the file like a detailed SPEF would
+        node = "%s/Y" % gate
+        for segment in range(1, rc + 1):
+            inner = "%s/Y:%d" % (gate, segment)
+            lines.append("R%d %s %s %.1f\n" % (segment + 1, node, inner, rnd.uniform(1, 20)))
+            lines.append("C%d %s 0 %.2e\n" % (segment + 2, inner, rnd.uniform(1e-16, 5e-16)))
+            node = inner
+        lines.append("R1 %s %s 10\n" % (node, load))
+        lines.append("C2 %s/Y 0 1e-15\n" % gate)
+        lines.append(".ends\n\n")
+    lines.append(".end\n")
+    return lines
+
+def write_paths(outDir, paths, stages, fanin, rc=0, seed=1, stream=None):
+    # path_0.sp ... like path_extraction.tcl, with the arrival windows summary next to them. With
+    # stream, also the manifest batchPaths.py --follow reads, one path every stream seconds
+    os.makedirs(outDir, exist_ok=True)
+    subcktFiles = []
+    manifest = open(os.path.join(outDir, "manifest.txt"), "w") if stream is not None else None
+    if manifest:
+        manifest.write("pid %d\n" % os.getpid())
+        manifest.flush()
+    with open(os.path.join(outDir, "arrival_windows.txt"), "w") as summary:
+        for pathNum in range(paths):
+            subcktFile = os.path.join(outDir, "path_%d.sp" % pathNum)
+            with open(subcktFile, "w") as f:
+                f.writelines(gen_path(pathNum, stages, fanin, rc, seed))
+            with open(os.path.join(outDir, "path_%d.subckt" % pathNum), "w") as f:
+                f.write("* Cell subcircuits come from the PDK, the stand-in ngspice doesn't read them\n")
+            summary.write("Path %d:\n  Point: in\n    Arrival Time: %.3f\n\n" % (pathNum, 0.1 * pathNum))
+            subcktFiles.append(subcktFile)
+            if manifest:
+                manifest.write("%d path_%d.sp %.3f\n" % (pathNum, pathNum, 0.1 * pathNum))
+                manifest.flush()
+                time.sleep(stream)
+    if manifest:
+        manifest.write("end\n")
+        manifest.close()
+    return subcktFiles
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1].startswith("--"):
+        print("Usage: genPaths.py <out dir> [--paths N] [--stages N] [--fanin N] [--rc N] [--seed N] [--stream s]")
+        sys.exit(1)
+    subcktFiles = write_paths(sys.argv[1], option_value("--paths", 1, int), option_value("--stages", 6, int),
+                              option_value("--fanin", 3, int), option_value("--rc", 0, int), option_value("--seed", 1, int),
+                              option_value("--stream", None, float))
+    print(f"Wrote {len(subcktFiles)} paths to {sys.argv[1]}")
+
+
+if __name__ == "__main__":
+    main()
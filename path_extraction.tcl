@@ -5,17 +5,23 @@ read_sdc sdc/spm.sdc
 
 file mkdir tmp_output
 set summaryFile [open tmp_output/arrival_windows.txt "w"]
+# Every finished path is listed here as "<index> <netlist> <first arrival>", then "end", so
+# batchPaths.py --follow can analyze it while later paths are still being extracted. The first
+# line names this process, so a manifest left by an earlier run isn't followed
+set manifest [open tmp_output/manifest.txt "w"]
+puts $manifest "pid [pid]"
+flush $manifest
 
 set max_paths 1000
 
-for {set i 0} {$i < $max_paths} {incr i} {
-    set path [lindex [find_timing_paths -sort_by_slack -group_count [expr {$i+1}]] $i]
-
-    if {[llength $path] == 0} {
-        puts "No more paths after index $i, quitting."
-        break
-    }
+# One query for all paths instead of one per path index
+set paths [find_timing_paths -path_delay max -sort_by_slack -group_count $max_paths]
+if {[llength $paths] < $max_paths} {
+    puts "Only [llength $paths] paths found."
+}
 
+set i 0
+foreach path $paths {
     set slack [get_property $path slack]
     set startpoint [get_property [get_property $path startPoint] full_name]
     set endpoint [get_property [get_property $path endPoint] full_name]
@@ -36,7 +42,14 @@ for {set i 0} {$i < $max_paths} {incr i} {
     file rename -force tmp/path_1.sp tmp_output/path_${i}.sp
     file rename -force tmp/path_1.subckt tmp_output/path_${i}.subckt
 
-    set path [lindex [find_timing_paths -path_delay max -sort_by_slack -group_count [expr {$i+1}]] $i]
+    # write_path_spice always names the deck path_1, point its include at this path's cells
+    set deckFile [open tmp_output/path_${i}.sp "r"]
+    set deck [read $deckFile]
+    close $deckFile
+    regsub {\.include "path_1\.subckt"} $deck ".include \"path_${i}.subckt\"" deck
+    set deckFile [open tmp_output/path_${i}.sp "w"]
+    puts -nonewline $deckFile $deck
+    close $deckFile
 
     set arcFile [open tmp_output/path_${i}_arcs.txt "w"]
     puts $arcFile "Timing Arcs for Min Delay Path $i"
@@ -47,6 +60,8 @@ for {set i 0} {$i < $max_paths} {incr i} {
     puts $summaryFile "Path $i:"
 
     set pathrefs [get_property $path points]
+    # A path without arcs has no first arrival, batchPaths.py starts it at 0
+    set first_arrival "-"
 
     for {set j 0} {$j < [expr {[llength $pathrefs] - 1}]} {incr j} {
         set pathrefA [lindex $pathrefs $j]
@@ -59,6 +74,9 @@ for {set i 0} {$i < $max_paths} {incr i} {
         set arrival [report_arrival $pinA]
         set vertex [$pinA vertices]
         set arrival [$vertex arrivals_clk_delays rise $clk "rise" 6]
+        if {$j == 0} {
+            set first_arrival $arrival
+        }
 
         puts $arcFile "\nPoint: [get_property $pinA full_name]"
         puts $arcFile "  Arrival Time: $arrival"
@@ -91,6 +109,14 @@ for {set i 0} {$i < $max_paths} {incr i} {
     puts $summaryFile "    Arrival Time: $final_arrival\n"
 
     close $arcFile
+    flush $summaryFile
+
+    # The path's files are complete, queue it for analysis
+    puts $manifest "$i path_${i}.sp $first_arrival"
+    flush $manifest
+    incr i
 }
 
+puts $manifest "end"
+close $manifest
 close $summaryFile
@@ -1,156 +1,565 @@
 #!/usr/bin/env python3
 
+import io
 import os
 import sys
 import re
+import json
+import time
+import queue
+import shutil
+import hashlib
+import inspect
+import tempfile
+import functools
+import threading
 import subprocess
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
 
-def locateFeatureIdx(subCircuit, begin, end, substring):
-    return next(
-        (idx for idx, txt in enumerate(subCircuit[begin:end], start=begin)
-        if substring in txt.lstrip()),
-        None
-    )
-
-def spice_lint(line, gate, subCircuitLines, partial):
-    commentPattern = re.compile(r'\bstage(\d+)\b')
-    uncommentPattern = re.compile(r'^\*\s*xstage(\d+)\b')
-
-    for idx, line in enumerate(subCircuitLines):
-        # Replace default subcircuit path with working path
-        if '.include "path_' in line:
-            tokens = line.strip().split()
-            subCircuitLines[idx] = tokens[0] + ' "' + workingPath.split("/")[0] + "/" + tokens[1].strip('"') + '"\n'
-        if(partial):
-            # If commented out but current stage, uncomment it
-            if uncommentPattern.search(line):
-                lineStageNum = int(commentPattern.search(line).group(1))
-                if lineStageNum == int(gate.stageNum[-1]):
-                    subCircuitLines[idx] = subCircuitLines[idx].strip("*")[1:]
-            # If stage instance is beyond the current stage comment it out
-            if commentPattern.search(line):
-                lineStageNum = int(commentPattern.search(line).group(1))
-                if lineStageNum > int(gate.stageNum[-1]) and subCircuitLines[idx][0] != "*":
-                    subCircuitLines[idx] = "* " + line
-                # Grab true final output net for current stage, not output load
-                if lineStageNum == int(gate.stageNum[-1]):
-                    stageNOutput = subCircuitLines[idx].split()[-2]
-                    stageNInput = subCircuitLines[idx].split()[-3]
-        else:
-            if commentPattern.search(line):
-                lineStageNum = int(commentPattern.search(line).group(1))
-                if lineStageNum == int(gate.stageNum[-1]):
-                    stageNOutput = subCircuitLines[idx].split()[-2]
-                    stageNInput = subCircuitLines[idx].split()[-3]
-        # Extend duration of pwl by percentage specified in stageData
-        if 'pwl' in line:
-            finalPwlLine = subCircuitLines[idx + 3].split()
-            finalPwlLine[0] = f"{gate.simTime:+.6e}"
-            finalPwlLine[1] += "\n"
-            subCircuitLines[idx + 3] = " ".join(finalPwlLine)
-        # Append max timestep to the default transient
-        if '.tran ' in line and len(subCircuitLines[idx].strip().split()) < 5:
-            subCircuitLines[idx] = subCircuitLines[idx].strip() + " 0  1e-12\n"
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def lint_header(path):
+    # Fixes every testbench of the path shares, applied once to the netlist header
+    netlist = path.netlist
+    lines = netlist.lines
+    header = lines[2:netlist.headerEnd]
+    for idx in netlist.includeLines:
+        # write_path_spice always includes path_1.subckt, the path's own cells are in <path>.subckt
+        if idx >= 2 and '.include "path_' in lines[idx]:
+            tokens = lines[idx].strip().split()
+            header[idx - 2] = tokens[0] + ' "' + path.workingPath + '.subckt"\n'
+    # Extend duration of pwl by percentage specified in stageData
+    finalPwlLine = lines[netlist.pwlLine + 3].split()
+    finalPwlLine[0] = f"{path.simTime:+.6e}"
+    finalPwlLine[1] += "\n"
+    header[netlist.pwlLine + 3 - 2] = " ".join(finalPwlLine)
+    # Append max timestep to the default transient
+    if len(lines[netlist.tranLine].strip().split()) < 5:
+        header[netlist.tranLine - 2] = lines[netlist.tranLine].strip() + " 0  1e-12\n"
+    return header
+
+def render_testbench(path, gate, overrides, partial, replay=None, l=None):
+    # Deck lines up to the measures, assembled from the indexed netlist. A partial deck keeps the
+    # stages up to the gate's stage and comments out the later stage instances, overrides replace
+    # whole lines (side-input sources) by their netlist index. A replay (first stage, net, points)
+    # drives that stage's input with a recorded waveform instead of simulating the stages before it.
+    # Decks of branch l use its adaptive transient once the stage's SIS run has set one
+    start = time.time()
+    netlist = path.netlist
+    lines = netlist.lines
+    firstStage = replay[0] if replay else 0
+    testLines = [lines[0], ".option noaskquit\n", path.models, path.cellLibrary]
+    header = path.header
+    if l is not None and gate.trans[l] and netlist.tranLine not in overrides:
+        overrides = {**overrides, netlist.tranLine: gate.trans[l]}
+    if partial or any(idx < netlist.headerEnd for idx in overrides):
+        header = list(header)
+        for idx, text in overrides.items():
+            if 2 <= idx < netlist.headerEnd:
+                header[idx - 2] = text
     if partial:
-        # Comment out nets belonging to commented out stages from the .print statement
-        for idx, line in enumerate(subCircuitLines):
-            if ".print" in line:
-                subCircuitLines[idx] = " ".join([subCircuitLines[idx].lstrip("*").strip(), subCircuitLines[idx+1].lstrip("*").strip()]).strip()
-
-                nets = subCircuitLines[idx].strip().split()
-                # If there is a net to comment out in the print
-                for j, net in enumerate(nets):
-                    if gate.netToCommentOut and gate.netToCommentOut in net:
-                        nets[j] = "\n*" + net
-                        if not getattr(gate, "_extra_print_line", False):
-                            gate._extra_print_line = True      # mark done
-                        break
-                subCircuitLines[idx] = " ".join(nets) + "\n"
-                subCircuitLines[idx + 1] = "\n"
-    return stageNOutput, stageNInput
-
-def sim_and_read(gate, testLines, testName, delayType, sideInputInstance, l, partial):
-    # Write the measure file
+        keptNets = []
+        for stage, idx in netlist.stageInstances.items():
+            if stage > gate.stageNumber or stage < firstStage:
+                header[idx - 2] = "* " + header[idx - 2]
+            else:
+                keptNets.extend(lines[idx].split()[1:-1])
+        if path.replay:
+            # Record the stage's load net, the input of the next stage, for the next replay
+            loadNet = lines[gate.subcktLine].split()[-1]
+            keptNets.append(loadNet)
+        # Only print nets of the stages kept, the others don't exist in this deck
+        printTokens = " ".join(lines[idx].strip().lstrip("+") for idx in netlist.printLines).split()
+        printNets = [net for net in printTokens[2:] if net.strip("v()") in keptNets]
+        if path.replay and "v(" + loadNet + ")" not in printNets:
+            printNets.append("v(" + loadNet + ")")
+        header[netlist.printLines[0] - 2] = " ".join(printTokens[:2] + printNets) + "\n"
+        for idx in netlist.printLines[1:]:
+            header[idx - 2] = "\n"
+    testLines.extend(header)
+    if path.raw:
+        # Only the stage ports, the stimulus and the gate's side inputs go to the rawfile, not every
+        # node inside the cells
+        savedNets = [gate.stage1Input]
+        for stage, idx in netlist.stageInstances.items():
+            if not partial or firstStage <= stage <= gate.stageNumber:
+                savedNets.extend(lines[idx].split()[1:-1])
+        if partial and path.replay:
+            savedNets.append(lines[gate.subcktLine].split()[-1])
+        # The gate's side inputs are internal to its stage subcircuit, flattened as xstageN.<net>
+        stageInstance = lines[netlist.stageInstances[gate.stageNumber]].split()[0]
+        savedNets.extend(stageInstance + "." + net for net in gate.sideInputs)
+        testLines.append(".save " + " ".join("v(" + net + ")" for net in OrderedDict.fromkeys(savedNets)) + "\n\n")
+    if replay:
+        testLines.extend(replay_source(replay))
+
+    for stage, (blockStart, subcktLine, endsLine) in netlist.stageBlocks.items():
+        if partial and stage > gate.stageNumber:
+            break
+        if stage < firstStage:
+            continue
+        offset = len(testLines) - blockStart
+        testLines.extend(lines[blockStart:endsLine + 1])
+        for idx, text in overrides.items():
+            if blockStart <= idx <= endsLine:
+                testLines[offset + idx] = text
+    if not partial:
+        testLines.extend(lines[netlist.tailStart:-1])
+    if path.profile:
+        path.profile.add("build", start, {"path": path.pathName, "stage": gate.stageNum, "lines": len(testLines)})
+    return testLines
+
+def replay_source(replay):
+    # PWL source replaying a waveform recorded at the input net of the first simulated stage,
+    # times stay absolute so measures still trigger on the stage 1 stimulus
+    firstStage, net, points = replay
+    return ["vreplay " + net + " 0 pwl(\n"] + [f"+{t:.6e} {v:.6e}\n" for t, v in points] + ["+)\n\n"]
+
+def sim_files(path, gate, delayType, sideInputInstance, l):
     if(l == 1): wcType = "Slowdown"
     elif(l == 0): wcType = "Speedup"
     else: wcType = "Original"
 
-    if delayType == "MIS":
-        spice_file = "_".join([workingPath, gate.stageNum, delayType, sideInputInstance, wcType, ".sp"])
-        log_file = "_".join([workingPath, gate.stageNum, delayType, sideInputInstance, wcType, ".log"])
-    else:
-        spice_file = "_".join([workingPath, gate.stageNum, delayType, wcType, ".sp"])
-        log_file = "_".join([workingPath, gate.stageNum, delayType, wcType, ".log"])
+    names = [path.workspace.base, gate.stageNum, delayType]
+    if sideInputInstance:
+        names.append(sideInputInstance)
+    spice_file = "_".join(names + [wcType, ".sp"])
+    log_file = "_".join(names + [wcType, ".log"])
+    return spice_file, log_file
+
+def write_sim(path, gate, testLines, delayType, sideInputInstance, l):
+    # Write the measure file
+    spice_file, log_file = sim_files(path, gate, delayType, sideInputInstance, l)
 
     with open(spice_file, "w") as f:
         f.writelines(testLines)
 
-    if(verbose):
+    if(path.verbose):
         print("Measuring " + delayType + " delay at: " + spice_file)
         print("Log file at " + log_file)
-    subprocess.run(
-        ["ngspice", "-b", "-q", "-o", log_file, spice_file],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
+    return spice_file, log_file
+
+def raw_file_of(log_file):
+    return os.path.splitext(log_file)[0] + ".raw"
+
+def run_sim(path, spice_file, log_file, controlled=False, printNets=None):
+    # Simulator wall and CPU seconds, CPU is None when a session ran the deck, and why the run
+    # failed, None when ngspice finished within path.simTimeout
+    # Decks without a .control block also write every saved vector to a binary rawfile in raw mode
+    raw_file = raw_file_of(log_file) if path.raw and not controlled else None
+    if raw_file and os.path.exists(raw_file):
+        os.remove(raw_file)
+    # simSlots bounds the ngspice processes shared by every path of a batch run
+    if path.simSlots is not None:
+        path.simSlots.acquire()
+    try:
+        start = time.time()
+        cpu = None
+        failure = None
+        timedOut = run_in_session(path.sessions, spice_file, log_file, controlled, raw_file, path.simTimeout,
+                                  None if raw_file else printNets) if path.sessions else None
+        if timedOut is None:
+            process = subprocess.Popen(
+                ["ngspice", "-b", "-q", "-o", log_file] + (["-r", raw_file] if raw_file else []) + [spice_file],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            # Kill a run that outlives the timeout, its deck is then retried or reported
+            expired = threading.Event()
+            def expire():
+                expired.set()
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+            timer = threading.Timer(path.simTimeout, expire) if path.simTimeout else None
+            if timer:
+                timer.start()
+            try:
+                if hasattr(os, "wait4"):
+                    # Reap it ourselves to get this child's own resource usage
+                    pid, status, usage = os.wait4(process.pid, 0)
+                    process.returncode = os.waitstatus_to_exitcode(status)
+                    cpu = usage.ru_utime + usage.ru_stime
+                else:
+                    process.wait()
+            finally:
+                if timer:
+                    timer.cancel()
+            timedOut = expired.is_set()
+            if not timedOut and process.returncode < 0:
+                failure = f"ngspice killed by signal {-process.returncode}"
+        if timedOut:
+            failure = f"timed out after {path.simTimeout:g} s"
+        end = time.time()
+    finally:
+        if path.simSlots is not None:
+            path.simSlots.release()
+    if path.profile:
+        path.profile.add("simulate", start, {"deck": os.path.basename(spice_file), "cpu": cpu}, end)
+    return end - start, cpu, failure
+
+def run_in_session(sessions, spice_file, log_file, controlled, raw_file=None, timeout=0, printNets=None):
+    # Whether the deck ran out of time, None when no session could run it, the caller then forks a
+    # batch ngspice instead
+    session = sessions.acquire()
+    if session is None:
+        return None
+    try:
+        return session.run(spice_file, log_file, controlled, raw_file, timeout, printNets)
+    except OSError:
+        return None
+    finally:
+        sessions.release(session)
+
+def print_nets(testLines):
+    # Vectors of the deck's .print line, None without one
+    for line in testLines:
+        if line.startswith(".print"):
+            return line.split()[2:] or None
+    return None
+
+def sim_failure(log_file):
+    # First line of an aborted ngspice run, None when the run went through. Operating point
+    # warnings ngspice recovers from don't count, the measures tell whether those runs worked
+    try:
+        with open(log_file, errors="replace") as f:
+            for line in f:
+                # Skip .print table rows
+                if line[:1].isdigit():
+                    continue
+                if convergencePattern.search(line):
+                    return line.strip()
+    except OSError:
+        return "no log written"
+    return None
+
+def relaxed_sim(sim, attempt):
+    # The sim retried with the attempt's relaxed options and maximum timestep, replacing an earlier
+    # retry's, written next to it
+    options, stepScale = simRelaxations[attempt]
+    gate, testLines, testName, delayType, sideInputInstance, l, partial = sim
+    relaxations = {option for option, scale in simRelaxations}
+    testLines = [line for line in testLines if line not in relaxations]
+    testLines.insert(2, options)
+    for idx, line in enumerate(testLines):
+        tokens = line.split()
+        if stepScale != 1.0 and tokens and tokens[0].lower() == ".tran" and len(tokens) > 4:
+            tokens[4] = f"{spice_number(tokens[4]) * stepScale:.3e}"
+            testLines[idx] = " ".join(tokens) + "\n"
+    sideInputInstance = re.sub(r"_?Retry\d+$", "", sideInputInstance or "")
+    return tagged_sim((gate, testLines, testName, delayType, sideInputInstance, l, partial), "Retry" + str(attempt + 1))
+
+def failed_result(sim):
+    # read_sim's shape for a sim that failed: None per test
+    return [None] * len(sim[2]) if isinstance(sim[2], list) else None
+
+def deck_name(path, sim):
+    return os.path.basename(sim_files(path, sim[0], sim[3], sim[4], sim[5])[0])
+
+def retry_failed(path, sims, results, parsed, offset, failures, attempt):
+    # Failed sims are rerun with the next relaxed options, their results and parsed logs from offset on
+    # are replaced by the retries'. Sims failing the last retry are reported, aborted runs keep None
+    # delays and runs missing a measure the delays they did measure
+    if attempt < min(path.retries, len(simRelaxations)):
+        retrySims = [relaxed_sim(sims[idx], attempt) for idx, failure in failures]
+        for idx, failure in failures:
+            print(f"Retrying {deck_name(path, sims[idx])} with {simRelaxations[attempt][0].strip()}"
+                  + (f" and {simRelaxations[attempt][1]:g}x max step" if simRelaxations[attempt][1] != 1.0 else "") + f": {failure}")
+        path.simRetries += len(retrySims)
+        retryParsed = []
+        retryResults = sim_and_read_all(path, retrySims, retryParsed, attempt + 1)
+        for (idx, failure), result, delays, retrySim in zip(failures, retryResults, retryParsed, retrySims):
+            results[idx] = result
+            if parsed is not None:
+                parsed[offset + idx] = delays
+            # The last retry's deck and log stand for the sim from now on
+            path.retriedSims[deck_name(path, sims[idx])] = path.retriedSims.get(deck_name(path, retrySim), retrySim)
+        return
+    for idx, failure in failures:
+        path.simFailures.append(f"{deck_name(path, sims[idx])}: {failure}")
+        print(f"FAILED: {deck_name(path, sims[idx])}: {failure}")
+
+def parse_log(log_file, waves=False):
+    # Latest input and output arrival of every test measured in the log, and with waves the
+    # .print table as {"v(net)": [[time, voltage], ...]}
     input_delay_pattern = re.compile(r"\b(t_[A-Za-z0-9_]+_delay)_INPUT_(?:rise|fall)\s*=\s*([\d.eE+\-]+)", re.IGNORECASE)
     output_delay_pattern = re.compile(r"\b(t_[A-Za-z0-9_]+_delay)_OUTPUT_(?:rise|fall)\s*=\s*([\d.eE+\-]+)", re.IGNORECASE)
+    slew_pattern = re.compile(r"\b(t_[A-Za-z0-9_]+_delay)_SLEW_(rise|fall)\s*=\s*([\d.eE+\-]+)", re.IGNORECASE)
 
-    input_delays = []
-    output_delays = []
+    input_delays = {}
+    output_delays = {}
+    slews = {}
+    columns = None
+    waveData = {}
 
     with open(log_file) as f:
         for line in f:
             if "Error" in line:
                 continue
+            if waves:
+                # Tables repeat their Index header on every page and split wide prints column-wise
+                tokens = line.split()
+                if tokens and tokens[0] == "Index":
+                    columns = [column.lower() for column in tokens[1:]]
+                    continue
+                if columns and len(tokens) == len(columns) + 1 and tokens[0].isdigit():
+                    for column, value in zip(columns, tokens[1:]):
+                        waveData.setdefault(column, {})[int(tokens[0])] = float(value)
+                    continue
             m_input = re.match(input_delay_pattern, line)
             if m_input:
-                input_delays.append(float(m_input.group(2)))
+                input_delays.setdefault(m_input.group(1).lower(), []).append(float(m_input.group(2)))
             m_output = re.match(output_delay_pattern, line)
             if m_output:
-                output_delays.append(float(m_output.group(2)))
-
-    input_delay_val = None
-    output_delay_val = None
-
-    if input_delays:
-        input_delay_val = max(input_delays) # Take the latest arrival time for input
-    if output_delays:
-        output_delay_val = max(output_delays) # Take the latest arrival time for output
+                output_delays.setdefault(m_output.group(1).lower(), []).append(float(m_output.group(2)))
+            m_slew = re.match(slew_pattern, line)
+            if m_slew:
+                slews.setdefault(m_slew.group(1).lower() + "_slew", [None, None])[m_slew.group(2).lower() == "fall"] = float(m_slew.group(3))
+
+    delays = {}
+    for name in list(input_delays) + list(output_delays):
+        input_delay_val = None
+        output_delay_val = None
+        if name in input_delays:
+            input_delay_val = max(input_delays[name]) # Take the latest arrival time for input
+        if name in output_delays:
+            output_delay_val = max(output_delays[name]) # Take the latest arrival time for output
+        delays[name] = (input_delay_val, output_delay_val)
+    # Rise and fall 20-80% slews, as {"t_..._delay_slew": (rise, fall)}
+    delays.update((name, tuple(slew)) for name, slew in slews.items())
+
+    time = waveData.pop("time", {})
+    for name, values in waveData.items():
+        delays[name] = compress_wave([[time[row], value] for row, value in sorted(values.items()) if row in time])
+    return delays
+
+def read_raw(raw_file):
+    # First plot of an ngspice binary rawfile as (vector names, points x vectors array). The
+    # header is text, the data every point's vectors as little-endian doubles, memory-mapped
+    names = []
+    with open(raw_file, "rb") as f:
+        header = {}
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError("no binary data in " + raw_file)
+            text = line.decode("latin-1").strip()
+            if text.startswith("Binary:"):
+                break
+            if text.startswith("Variables:"):
+                for _ in range(int(header["No. Variables"])):
+                    idx, name, kind = f.readline().decode("latin-1").split()[:3]
+                    name = name.lower()
+                    if kind == "voltage" and not name.startswith("v("):
+                        name = "v(" + name + ")"
+                    names.append(name)
+                continue
+            key, _, value = text.partition(":")
+            header[key] = value.strip()
+        offset = f.tell()
+    width = len(names) * (2 if "complex" in header.get("Flags", "") else 1)
+    # A run cut short leaves fewer points than the header announced
+    points = min(int(header["No. Points"]), (os.path.getsize(raw_file) - offset) // (8 * width))
+    data = np.memmap(raw_file, dtype="<f8", mode="r", offset=offset, shape=(points, width))
+    return names, data[:, ::width // len(names)]
+
+def crossings(time, data, threshold):
+    # Every crossing of threshold by every vector at once, linearly interpolated between
+    # timesteps: (point, vector) indices, crossing times and whether each crossing rises
+    above = data >= threshold
+    rows, cols = np.nonzero(above[1:] != above[:-1])
+    v0, v1 = data[rows, cols], data[rows + 1, cols]
+    t0, t1 = time[rows], time[rows + 1]
+    return cols, t0 + (threshold - v0) * (t1 - t0) / (v1 - v0), above[rows + 1, cols]
+
+def first_crossings(count, cols, times, rising):
+    # Earliest rising and falling crossing per vector, nonzero keeps crossings in time order
+    first = [[None] * count, [None] * count]
+    for direction in (True, False):
+        picked = rising == direction
+        vectors, idx = np.unique(cols[picked], return_index=True)
+        for vector, t in zip(vectors.tolist(), times[picked][idx].tolist()):
+            first[0 if direction else 1][vector] = t
+    return first
+
+def parse_raw(raw_file, testLines, vdd, waves=False):
+    # Same results as parse_log, the deck's .measure lines evaluated on the rawfile vectors, plus
+    # {"@v(net)": [rise, fall, rise slew, fall slew]} for every saved vector (VDD/2 crossings, 20-80%)
+    names, data = read_raw(raw_file)
+    time = np.asarray(data[:, names.index("time")])
+    vectors = [idx for idx, name in enumerate(names) if name.startswith("v(")]
+    data = np.asarray(data[:, vectors])
+    names = [names[idx] for idx in vectors]
+
+    half = first_crossings(len(names), *crossings(time, data, vdd / 2))
+    low  = first_crossings(len(names), *crossings(time, data, vdd * 0.2))
+    high = first_crossings(len(names), *crossings(time, data, vdd * 0.8))
+    delays = {}
+    for idx, name in enumerate(names):
+        riseSlew = high[0][idx] - low[0][idx] if high[0][idx] is not None and low[0][idx] is not None else None
+        fallSlew = low[1][idx] - high[1][idx] if high[1][idx] is not None and low[1][idx] is not None else None
+        delays["@" + name] = [half[0][idx], half[1][idx], riseSlew, fallSlew]
+        if waves:
+            delays[name] = compress_wave(np.column_stack((time, data[:, idx])).tolist())
+
+    # Crossings the measures ask for, counted from time zero like .measure does
+    measurePattern = re.compile(r"^\.measure tran (t_[A-Za-z0-9_]+_delay)_(INPUT|OUTPUT)_\S+ TRIG (v\(\S+\)) VAL=\S+ (RISE|FALL)=1 TARG (v\(\S+\)) VAL=\S+ (RISE|FALL)=1", re.IGNORECASE)
+    arrivals = {}
+    for line in testLines:
+        m = measurePattern.match(line)
+        if not m:
+            continue
+        name, side, trig, trigDir, targ, targDir = m.groups()
+        trigCross = delays.get("@" + trig.lower(), [None, None])[0 if trigDir.upper() == "RISE" else 1]
+        targCross = delays.get("@" + targ.lower(), [None, None])[0 if targDir.upper() == "RISE" else 1]
+        if trigCross is not None and targCross is not None:
+            # Rounded like the log prints measures, so delays from either source compare exactly
+            arrivals.setdefault((name.lower(), side.upper()), []).append(float(f"{targCross - trigCross:.6e}"))
+    for name in {name for name, side in arrivals}:
+        # Take the latest arrival time, as for the log
+        input_delay_val = max(arrivals[(name, "INPUT")]) if (name, "INPUT") in arrivals else None
+        output_delay_val = max(arrivals[(name, "OUTPUT")]) if (name, "OUTPUT") in arrivals else None
+        delays[name] = (input_delay_val, output_delay_val)
+    return delays
+
+def compress_wave(points, tol=1e-3):
+    # Douglas-Peucker: keep the point furthest from the chord of each segment until every recorded
+    # point is within tol volts of the emitted PWL, a recorded transition keeps a few dozen of the
+    # thousands of timesteps. Repeated timepoints are dropped first
+    if len(points) < 3:
+        return points
+    wave = [points[0]]
+    for point in points[1:]:
+        if point[0] > wave[-1][0]:
+            wave.append(point)
+    keep = [False] * len(wave)
+    keep[0] = keep[-1] = True
+    segments = [(0, len(wave) - 1)]
+    while segments:
+        first, last = segments.pop()
+        (t0, v0), (t1, v1) = wave[first], wave[last]
+        slope = (v1 - v0) / (t1 - t0)
+        worst, split = tol, None
+        for idx in range(first + 1, last):
+            error = abs(wave[idx][1] - v0 - slope * (wave[idx][0] - t0))
+            if error > worst:
+                worst, split = error, idx
+        if split is not None:
+            keep[split] = True
+            segments.extend([(first, split), (split, last)])
+    return [point for point, k in zip(wave, keep) if k]
+
+def read_sim(gate, log_file, testName, delayType, partial, delays):
+    if isinstance(testName, list):
+        # A multi-variant deck measures one test per variant
+        return [read_sim(gate, log_file, name, delayType, partial, delays) for name in testName]
+    input_delay_val, output_delay_val = delays.get(testName.lower(), (None, None))
 
     # Handle cases where no delay was found (e.g., if log was empty or patterns didn't match)
+    # Missing delays are left None, they must not read as a 0 ps arrival
     if input_delay_val is None and not delayType == "MIS":
         print(f"WARNING: Could not find input delay for {log_file}")
-        # You might want to assign a very large number or handle as error
-        input_delay_val = 0.0 # Or some default that makes sense for your flow
     if output_delay_val is None:
         print(f"WARNING: Could not find output delay for {log_file}")
-        output_delay_val = 0.0 # Or some default
-        
+
     if(partial):
         return output_delay_val, input_delay_val
     else:
         return output_delay_val
 
-def measure_sis_delay(gate, measureLines, line, lines, partial, first, l):
-    testName = "t_" + workingPath.split("/")[1] + "_sis_delay"
-    if(first):
-        measureLines.append(lines[0])
-        measureLines.append(".option noaskquit\n")
-        measureLines.append(models)
-        measureLines.append(cellLibrary)
-        if(partial):
-            measureLines.extend(lines[2: gate.endsLine + 1])
-            stageNOutput, stageNInput = spice_lint(line, gate, measureLines, partial)
-        else: # SIS delay for total critical path
-            measureLines.extend(lines[2:-1])
-            stageNOutput, stageNInput = spice_lint(line, gate, measureLines, partial)
-            stageNOutput = gate.finalOutput
+def sim_and_read(path, gate, testLines, testName, delayType, sideInputInstance, l, partial, parsed=None):
+    return sim_and_read_all(path, [(gate, testLines, testName, delayType, sideInputInstance, l, partial)], parsed)[0]
+
+def sim_and_read_all(path, sims, parsed=None, attempt=0):
+    # Every sim is (gate, testLines, testName, delayType, sideInputInstance, l, partial).
+    # Decks are written and logs parsed in submission order, only ngspice itself runs
+    # concurrently, so results and console output do not depend on which job finishes first.
+    # parsed collects every deck's parsed log, waveforms included in replay mode. Runs that time out
+    # or don't converge are retried with relaxed options, attempt counts the retries already made,
+    # and give None delays when every retry failed
+    simFiles = []
+    for gate, testLines, testName, delayType, sideInputInstance, l, partial in sims:
+        start = time.time()
+        simFiles.append(write_sim(path, gate, testLines, delayType, sideInputInstance, l))
+        if path.profile:
+            path.profile.add("write", start, {"deck": os.path.basename(simFiles[-1][0])})
+
+    # Decks already simulated with the same models and simulator, and parsed the same way, are
+    # answered from the cache
+    mode = " ".join(name for name, on in (("raw", path.raw), ("waves", path.replay)) if on)
+    cacheKeys = [path.cache.key(sim[1], mode, path.includeIdentity) if path.cache else None for sim in sims]
+    cached = [path.cache.get(key) if key else None for key in cacheKeys]
+    # Decks with a .control block run their own analyses. Pipe mode ngspice ignores .print, so in
+    # replay mode the sessions print the waveforms the other decks record themselves
+    toRun = []
+    for sim, files, delays in zip(sims, simFiles, cached):
+        if delays is None:
+            controlled = ".control\n" in sim[1]
+            toRun.append(files + (controlled, print_nets(sim[1]) if path.replay and not controlled else None))
+
+    if path.jobs > 1 and len(toRun) > 1:
+        # ngspice does the work in its own process, threads only wait on it
+        with ThreadPoolExecutor(max_workers=min(path.jobs, len(toRun))) as pool:
+            timings = list(pool.map(lambda files: run_sim(path, *files), toRun))
     else:
-        stageNOutput, stageNInput = spice_lint(line, gate, measureLines, partial)
-
+        timings = [run_sim(path, *files) for files in toRun]
+    timings = iter(timings)
+
+    results = []
+    failures = []
+    for idx, (sim, (spice_file, log_file), key, delays) in enumerate(zip(sims, simFiles, cacheKeys, cached)):
+        start = time.time()
+        wall = cpu = None
+        failure = None
+        if delays is None:
+            wall, cpu, failure = next(timings)
+            failure = failure or sim_failure(log_file)
+            raw_file = raw_file_of(log_file)
+            if path.raw and ".control\n" not in sim[1] and os.path.exists(raw_file):
+                delays = parse_raw(raw_file, sim[1], float(sim[0].VDD), path.replay)
+            else:
+                delays = parse_log(log_file, path.replay) if os.path.exists(log_file) else {}
+            if path.cache:
+                path.cacheMisses += 1
+                # Only keep runs that measured something, a failed run should be retried next time
+                if not failure and any(delays[name][1] is not None for name in delays if name.startswith("t_")):
+                    path.cache.put(key, delays)
+        else:
+            path.cacheHits += 1
+        if path.profile:
+            end = time.time()
+            path.profile.add("parse", start, {"deck": os.path.basename(spice_file)}, end)
+            path.profile.sim(path, sim, spice_file, wall, cpu, end - start)
+        if parsed is not None:
+            parsed.append(delays)
+        result = failed_result(sim) if failure else read_sim(sim[0], log_file, sim[2], sim[3], sim[6], delays)
+        # A run that went through but missed its output measure is retried too, unless it is an
+        # adaptive deck that may have stopped early, adaptive_rerun handles those
+        if not failure and wall is not None and not adaptive_deck(sim) and None in output_delays(result):
+            failure = "output delay not measured"
+        if failure:
+            failures.append((idx, failure))
+        results.append(result)
+    if failures:
+        retry_failed(path, sims, results, parsed, len(parsed) - len(sims) if parsed is not None else 0, failures, attempt)
+    if path.adaptive:
+        adaptive_rerun(path, sims, results, parsed, len(parsed) - len(sims) if parsed is not None else 0)
+    return results
+
+def sis_testbench(path, gate, overrides, partial, l, replay=None):
+    testName = "t_" + path.pathName + "_sis_delay"
+    measureLines = render_testbench(path, gate, overrides, partial, replay)
+    stagePorts = path.lines[gate.subcktLine].split()
+    # Grab true final output net for current stage, not output load
+    stageNOutput, stageNInput = stagePorts[-2], stagePorts[-3]
+    if not partial: # SIS delay for total critical path
+        stageNOutput = gate.finalOutput
 
     if gate.stage1Vi > 0:
         measureLines.append(".measure tran " + testName + "_INPUT_FALL TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1 TARG v(" + stageNInput + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1\n")
@@ -165,79 +574,642 @@ def measure_sis_delay(gate, measureLines, line, lines, partial, first, l):
         measureLines.append(".measure tran " + testName + "_OUTPUT_RISE TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1\n")
         measureLines.append(".plot tran v(" + gate.stage1Input + ") v(" + stageNOutput + ")\n.end\n")
 
+    # MIS tables are indexed by the slew of the stage input, adaptive transients sized by the slews
+    # at the outputs. The rawfile gives them without measures
+    if partial and path.tables:
+        measureLines[-1:-1] = slew_measures(gate, slew_name(path, "input"), stageNInput)
+    if partial and path.adaptive:
+        measureLines[-1:-1] = slew_measures(gate, slew_name(path, "output"), stageNOutput)
+
+    return (gate, measureLines, testName, "SIS", None, l, partial), stageNOutput
+
+def slew_name(path, port):
+    return "t_" + path.pathName + "_sis_" + port + "_delay"
+
+def slew_measures(gate, slewName, net):
+    # 20-80% rise and fall times of net
+    vdd = float(gate.VDD)
+    low, high = str(round(vdd * 0.2, 6)), str(round(vdd * 0.8, 6))
+    return [".measure tran " + slewName + "_SLEW_RISE TRIG v(" + net + ") VAL=" + low + " RISE=1 TARG v(" + net + ") VAL=" + high + " RISE=1\n",
+            ".measure tran " + slewName + "_SLEW_FALL TRIG v(" + net + ") VAL=" + high + " FALL=1 TARG v(" + net + ") VAL=" + low + " FALL=1\n"]
+
+def measure_sis_delay(path, gate, overrides, partial, l, replay=None):
+    sim, stageNOutput = sis_testbench(path, gate, overrides, partial, l, replay)
     if partial:
-        output_delay_val, input_delay_val = sim_and_read(gate, measureLines, testName, "SIS", None, l, partial)
+        parsed = []
+        result = sim_and_read(path, *sim, parsed)
+        if result is None or None in result:
+            raise RuntimeError("SIS simulation of " + deck_name(path, sim) + " failed")
+        output_delay_val, input_delay_val = result
+        # The rawfile or the slew measures also give the output transition's 20-80% slew
+        output = transition(parsed[0], slew_name(path, "output"), stageNOutput)
+        if output:
+            gate.outputRising, gate.outputSlew = output
+            print(f"SIS slew at gate output: {gate.outputSlew * 1e12:.3f} ps")
+        if path.tables:
+            inputTransition = transition(parsed[0], slew_name(path, "input"), path.lines[gate.subcktLine].split()[-3])
+            for branch in (range(len(gate.inputTransitions)) if l is None else [l]):
+                gate.inputTransitions[branch] = inputTransition
         return output_delay_val, input_delay_val, stageNOutput
     else:
-        final_output_delay_val = sim_and_read(gate, measureLines, testName, "SIS", None, l, partial)
+        final_output_delay_val = sim_and_read(path, *sim)
+        if final_output_delay_val is None:
+            raise RuntimeError("SIS simulation of " + deck_name(path, sim) + " failed")
         return final_output_delay_val
 
-def measure_mis_delay(subCircuitLines, finalV, instanceName, mainInputAT, gate, line, lines, instanceLine, instanceIdx, l):
-    # If first mis, construct entire file
-    firstWorstImpactIdx = next(
-        (i for i, stage in enumerate(gates) if (stage.worstSpeedupImpact or stage.worstSlowdownImpact)),
-        None
-    )
-    # If previous stage had side inputs and generated a MIS, extend file with next stage from lines
-    if (sum(1 for stage in gates if stage.worstSpeedupImpact) > 0 or sum(1 for stage in gates if stage.worstSlowdownImpact) > 0) and \
-        (int(gate.stageNum[-1]) > int(gates[firstWorstImpactIdx].stageNum[-1])):
-        subCircuitLines[-1] = "\n"
-        subCircuitLines.extend(lines[gate.gateLine - 1: gate.endsLine + 1])
-    # with open("test_SCL.sp", "w") as f:
-    #     f.writelines(subCircuitLines)
-    # print("Written to test_SCL.sp")
-    # Rising or Falling pwl
+def transition(delays, slewName, net):
+    # (rising, 20-80% slew) of net's last transition from the rawfile vectors or the log's slew measures
+    rise, fall, riseSlew, fallSlew = delays.get("@v(" + net.lower() + ")", [None] * 4)
+    if rise is not None or fall is not None:
+        rising = fall is None or (rise is not None and rise > fall)
+    else:
+        riseSlew, fallSlew = delays.get(slewName.lower() + "_slew", (None, None))
+        rising = riseSlew is not None
+    slew = riseSlew if rising else fallSlew
+    return (rising, slew) if slew is not None else None
 
+def mis_measures(gate, testName, stageNOutput):
+    if gate.stage1Vi > 0:
+        return [".measure tran " + testName + "_OUTPUT_FALL TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1\n",
+                ".measure tran " + testName + "_OUTPUT_RISE TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1\n"]
+    else:
+        return [".measure tran " + testName + "_OUTPUT_FALL TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1\n",
+                ".measure tran " + testName + "_OUTPUT_RISE TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1\n"]
+
+def control_measures(gate, testName, stageNOutput):
+    # mis_measures as the meas commands of a .control block, interactive ngspice has no measure command
+    return ["meas" + measure[len(".measure"):] for measure in mis_measures(gate, testName, stageNOutput)]
+
+def autostop(path, gate, l, testLines):
+    # An adaptive deck without a .control block ends its transient with .option autostop once its
+    # measures are done, the estimated stop time only bounds it. autostop waits for every measure,
+    # so only the one in the output direction the SIS run saw is kept. Replay decks run on to the
+    # stop time, the load net's edge they record comes after the output measure
+    if l is None or not gate.trans[l] or gate.outputRising is None or path.replay:
+        return testLines
+    other = "_OUTPUT_FALL " if gate.outputRising else "_OUTPUT_RISE "
+    testLines = [line for line in testLines if not (line.startswith(".measure") and other in line)]
+    testLines.insert(2, ".option autostop\n")
+    return testLines
+
+def mis_pwl(gate, instanceName, finalV, mainInputAT, skew=0.0):
+    if skew:
+        return instanceName + " PWL(" + " ".join(str(v) for v in skew_points(gate, finalV, mainInputAT, skew)) + ")\n"
+    # Rising or Falling pwl
     if(float(finalV) > 0):
-        subCircuitLines[locateFeatureIdx(subCircuitLines, gate.gateLine, gate.endsLine, instanceName)] = instanceName + " PWL(0ns 0V " + str(mainInputAT) + " " + str(gate.VDD) +  "V)\n"
+        return instanceName + " PWL(0ns 0V " + str(mainInputAT) + " " + str(gate.VDD) +  "V)\n"
     else:
-        subCircuitLines[locateFeatureIdx(subCircuitLines, gate.gateLine, gate.endsLine, instanceName)] = instanceName + " PWL(0ns " +  str(gate.VDD) + "V "+ str(mainInputAT) + " 0V)\n"
-    # After modifying side input instance, append the rest of the subcircuit
-    #subCircuitLines.extend(lines[instanceIdx + 1 : gate.endsLine + 1])
+        return instanceName + " PWL(0ns " +  str(gate.VDD) + "V "+ str(mainInputAT) + " 0V)\n"
+
+def mis_testbench(path, overrides, instanceName, stageNOutput, gate, instanceLine, l, replay=None):
+    # overrides already switch this side input, and the winners of earlier stages
+    subCircuitLines = render_testbench(path, gate, overrides, True, replay, l)
 
     sideInputInstance = instanceLine[1].replace('/', '')
     testName = "t_mis" + sideInputInstance.lower() + "_delay"
     # add trans to testbench following the testbench
-    if gate.stage1Vi > 0:
-        subCircuitLines.append(".measure tran " + testName + "_OUTPUT_FALL TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1\n")
-        subCircuitLines.append(".measure tran " + testName + "_OUTPUT_RISE TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1\n")
-        subCircuitLines.append(".plot tran v(" + gate.stage1Input + ") v(" + instanceName + ") v(" + stageNOutput + ")\n.end\n")
-
-    else:
-        subCircuitLines.append(".measure tran " + testName + "_OUTPUT_FALL TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " FALL=1\n")
-        subCircuitLines.append(".measure tran " + testName + "_OUTPUT_RISE TRIG v(" + gate.stage1Input + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1 TARG v(" + stageNOutput + ") VAL="+  str(float(gate.VDD)/2) + " RISE=1\n")
-        subCircuitLines.append(".plot tran v(" + gate.stage1Input + ") v(" + instanceName + ") v(" + stageNOutput + ")\n.end\n")
-
-    # Replace includes with proper paths
-    spice_lint(line, gate, subCircuitLines, True)
+    subCircuitLines.extend(mis_measures(gate, testName, stageNOutput))
+    subCircuitLines.append(".plot tran v(" + gate.stage1Input + ") v(" + instanceName + ") v(" + stageNOutput + ")\n.end\n")
+    subCircuitLines = autostop(path, gate, l, subCircuitLines)
 
-    # Write subcircuit sim to separate file
+    # Simulation for sim_and_read_all, written to a separate file
     # subcktFile: path#_stage#_sim
-    return sim_and_read(gate, subCircuitLines, (testName), "MIS", sideInputInstance, l, False)
+    return (gate, subCircuitLines, (testName), "MIS", sideInputInstance, l, False)
+
+def mis_sweep_testbench(path, overrides, variants, mainInputAT, stageNOutput, gate, l, replay=None):
+    # One deck for every side input of the stage: the circuit is parsed once and a .control loop
+    # alters one side-input PWL at a time, reruns the transient and measures it under its own test name
+    overrides = dict(overrides)
+    testNames = []
+    controlLines = [".control\n"]
+    for sourceLine, instanceName, finalV, instanceLine in variants:
+        # Side inputs sit at their sensitizing value as a flat PWL, so a variant only alters its points
+        overrides[sourceLine] = instanceName + " PWL(0ns " + finalV + "V " + str(mainInputAT) + " " + finalV + "V)\n"
+
+        # Sources inside the stage subcircuit are flattened to v.<stage instance>.<source>
+        source = "@v.x" + gate.stageNum.lower() + "." + instanceLine[0].lower() + "[pwl]"
+        if(float(finalV) > 0):
+            transition = [0, 0, mainInputAT, float(gate.VDD)]
+        else:
+            transition = [0, float(gate.VDD), mainInputAT, 0]
+
+        sideInputInstance = instanceLine[1].replace('/', '')
+        testName = "t_mis" + sideInputInstance.lower() + "_delay"
+        testNames.append(testName)
+
+        controlLines.append("alter " + source + " = [ " + " ".join(str(v) for v in transition) + " ]\n")
+        controlLines.append("run\n")
+        controlLines.extend(control_measures(gate, testName, stageNOutput))
+        controlLines.append("destroy all\n")
+        controlLines.append("alter " + source + " = [ 0 " + finalV + " " + str(mainInputAT) + " " + finalV + " ]\n")
+    controlLines.append(".endc\n.end\n")
+
+    subCircuitLines = render_testbench(path, gate, overrides, True, replay, l)
+    subCircuitLines.extend(controlLines)
+
+    return (gate, subCircuitLines, testNames, "MIS", "sweep", l, False)
+
+
+def skew_points(gate, finalV, mainInputAT, skew):
+    # Side-input transition of mis_pwl moved by skew, as three points however far it moved so a
+    # .control loop can alter one into another. An earlier ramp is cut off at time 0
+    vdd = float(gate.VDD)
+    v0, v1 = (0.0, vdd) if float(finalV) > 0 else (vdd, 0.0)
+    if skew > 0:
+        return [0, v0, skew, v0, mainInputAT + skew, v1]
+    start = v0 + (v1 - v0) * (-skew / mainInputAT)
+    return [0, start, mainInputAT + skew, v1, gate.simTime, v1]
+
+def mis_skew_testbench(path, overrides, variants, mainInputAT, stageNOutput, gate, l, name, replay=None):
+    # One deck trying side inputs at other skews: each variant's source sits at its sensitizing value
+    # as a flat three-point PWL, and a .control loop alters it to the moved transition, reruns the
+    # transient and measures it under the variant's test name
+    overrides = dict(overrides)
+    testNames = []
+    controlLines = [".control\n"]
+    for sourceLine, instanceLine, skew, testName in variants:
+        instanceName = " ".join(instanceLine[:-1])
+        finalV       = instanceLine[-1]
+        flat = [0, float(finalV), mainInputAT, float(finalV), gate.simTime, float(finalV)]
+        overrides[sourceLine] = instanceName + " PWL(" + " ".join(str(v) for v in flat) + ")\n"
+
+        source = "@v.x" + gate.stageNum.lower() + "." + instanceLine[0].lower() + "[pwl]"
+        testNames.append(testName)
+        controlLines.append("alter " + source + " = [ " + " ".join(str(v) for v in skew_points(gate, finalV, mainInputAT, skew)) + " ]\n")
+        controlLines.append("run\n")
+        controlLines.extend(control_measures(gate, testName, stageNOutput))
+        controlLines.append("destroy all\n")
+        controlLines.append("alter " + source + " = [ " + " ".join(str(v) for v in flat) + " ]\n")
+    controlLines.append(".endc\n.end\n")
+
+    subCircuitLines = render_testbench(path, gate, overrides, True, replay, l)
+    subCircuitLines.extend(controlLines)
+
+    return (gate, subCircuitLines, testNames, "MIS", name, l, False)
+
+
+def tagged_sim(sim, tag):
+    # Variant of a sim (full-prefix twin, coarse estimate, ...) written next to it instead of over it
+    gate, testLines, testName, delayType, sideInputInstance, l, partial = sim
+    return (gate, testLines, testName, delayType, "_".join(filter(None, [sideInputInstance, tag])), l, partial)
+
+def replay_check(path, prefixSims, replayed):
+    # Simulate the full-prefix twins and report how far the replayed delays drifted from them
+    prefixDelays = sim_and_read_all(path, prefixSims)
+    deviations = []
+    for replayDelay, prefixDelay in zip(replayed, prefixDelays):
+        if isinstance(prefixDelay, (list, tuple)):
+            deviations.extend(abs(a - b) for a, b in zip(replayDelay, prefixDelay) if a is not None and b is not None)
+        elif replayDelay is not None and prefixDelay is not None:
+            deviations.append(abs(replayDelay - prefixDelay))
+    if not deviations:
+        return
+    deviation = max(deviations)
+    path.replayError = max(deviation, path.replayError or 0.0)
+    print(f"Replay check: {deviation * 1e12:.3f} ps largest deviation over {len(deviations)} delays")
+
+def record_replay(path, gate, delays, instanceLine, overrides, stageNOutput, l, replay):
+    # The winner's waveform at the stage's load net drives the next stage from now on. Sweep decks
+    # don't print it, so they rerun the winner's standalone deck
+    loadNet = path.lines[gate.subcktLine].split()[-1]
+    wave = delays.get("v(" + loadNet.lower() + ")")
+    if not wave:
+        instanceName = " ".join(instanceLine[:-1])
+        wcSim = mis_testbench(path, overrides, instanceName, stageNOutput, gate, instanceLine, l, replay)
+        parsed = []
+        sim_and_read_all(path, [wcSim], parsed)
+        wave = parsed[0].get("v(" + loadNet.lower() + ")")
+    if not wave:
+        # Nothing recorded, keep simulating from the previous replay
+        print(f"WARNING: No waveform recorded at {loadNet}, simulating the path prefix")
+        return replay
+    return (gate.stageNumber + 1, loadNet, wave)
+
+
+def coarse_tran(path, gate, l):
+    # The branch's transient with timestep and max timestep coarseFactor times larger
+    tokens = (gate.trans[l] or path.header[path.netlist.tranLine - 2]).split()
+    tokens[1] = f"{float(tokens[1]) * coarseFactor:g}"
+    tokens[-1] = f"{float(tokens[-1]) * coarseFactor:g}"
+    return " ".join(tokens) + "\n"
+
+def mis_sims(path, gate, sources, worstCases, l, replay, mainInputAT, stageNOutput, sweep=None):
+    # Full MIS sims of the given side-input sources of branch l, one per source or one sweep deck,
+    # sweep overrides path.sweep
+    sweep = path.sweep if sweep is None else sweep
+    sims = []
+    variants = []
+    for j in sources:
+        instanceLine = path.lines[j].strip().split()
+        instanceName = " ".join(instanceLine[:-1])
+        finalV       = instanceLine[-1]
+        overrides = dict(worstCases[l])
+        overrides[j] = mis_pwl(gate, instanceName, finalV, mainInputAT)
+        if sweep:
+            variants.append((j, instanceName, finalV, instanceLine))
+        else:
+            sims.append(mis_testbench(path, overrides, instanceName, stageNOutput, gate, instanceLine, l, replay))
+    if variants:
+        sims.append(mis_sweep_testbench(path, worstCases[l], variants, mainInputAT, stageNOutput, gate, l, replay))
+    return sims
+
+def flat_delays(delays):
+    # Sweep decks give one delay per variant
+    return [delay for result in delays for delay in (result if isinstance(result, list) else [result])]
+
+def prune_candidates(path, gate, candidates, worstCases, replays, mainInputATs, mainOutputATs, stageNOutput):
+    # Rank each branch's side inputs by a coarse-timestep MIS simulation, all of a branch's in one
+    # sweep deck so the estimates cost one launch and circuit parse instead of one per side input.
+    # Keep the path.prune best and any within path.pruneMargin of the last of them, dropping those
+    # whose estimate can't win even with pruneMargin of error. Returns the kept and the pruned
+    # sources of every branch
+    coarse = {}
+    coarseSims = []
+    for l, sources in enumerate(candidates):
+        if len(sources) > path.prune:
+            coarseWorstCases = [{**overrides, path.netlist.tranLine: coarse_tran(path, gate, branch)} for branch, overrides in enumerate(worstCases)]
+            coarse[l] = len(coarseSims)
+            coarseSims.extend(tagged_sim(sim, "Coarse") for sim in
+                              mis_sims(path, gate, sources, coarseWorstCases, l, replays[l], mainInputATs[l], stageNOutput, sweep=True))
+    estimates = flat_delays(sim_and_read_all(path, coarseSims))
+    path.coarseSims += len(estimates)
+
+    kept = []
+    pruned = []
+    offset = 0
+    for l, sources in enumerate(candidates):
+        if l not in coarse:
+            kept.append(sources)
+            pruned.append([])
+            continue
+        # Speedup wants the most negative impact, Slowdown the most positive
+        # Side inputs the coarse run couldn't measure (None) are kept
+        scores = [None if estimate is None else (estimate - mainOutputATs[l]) * (1 if l == 0 else -1)
+                  for estimate in estimates[offset:offset + len(sources)]]
+        offset += len(sources)
+        ranked = sorted(score for score in scores if score is not None)
+        cutoff = ranked[min(path.prune, len(ranked)) - 1] + path.pruneMargin if ranked else 0.0
+        keep = [score is None or (score <= path.pruneMargin and score <= cutoff) for score in scores]
+        kept.append([j for j, k in zip(sources, keep) if k])
+        pruned.append([j for j, k in zip(sources, keep) if not k])
+        path.simsPruned += len(pruned[-1])
+        print(f"Pruned {len(pruned[-1])} of {len(sources)} side inputs ({['Speedup', 'Slowdown'][l]}) after coarse ranking")
+    return kept, pruned
+
+def prune_check(path, gate, pruned, worstCases, replays, mainInputATs, mainOutputATs, stageNOutput):
+    # Simulate the side inputs --prune skipped and report any that beats the winner it kept
+    sims = []
+    owners = []
+    for l, sources in enumerate(pruned):
+        for sim in mis_sims(path, gate, sources, worstCases, l, replays[l], mainInputATs[l], stageNOutput):
+            sims.append(tagged_sim(sim, "Exhaustive"))
+        owners.extend((l, j) for j in sources)
+    delays = flat_delays(sim_and_read_all(path, sims))
+    winners = [(gate.worstSpeedupImpact, gate.wcSpeedupInstance), (gate.worstSlowdownImpact, gate.wcSlowdownInstance)]
+    for l in range(len(pruned)):
+        sign = 1 if l == 0 else -1
+        best = None
+        for (owner, j), delay in zip(owners, delays):
+            if owner == l and delay is not None and (best is None or sign * (delay - mainOutputATs[l]) < sign * best[0]):
+                best = (delay - mainOutputATs[l], path.lines[j].split()[1].replace('/', ''))
+        if best is None:
+            continue
+        impact, instance = winners[l]
+        if sign * best[0] < 0 and (impact is None or sign * best[0] < sign * impact):
+            path.pruneMisses += 1
+            print(f"Prune check: {['Speedup', 'Slowdown'][l]} missed {best[1]} ({best[0] * 1e12:.3f} ps), kept "
+                  + (f"{instance} ({impact * 1e12:.3f} ps)" if instance else "none"))
+        else:
+            print(f"Prune check: {['Speedup', 'Slowdown'][l]} winner confirmed against {len([o for o in owners if o[0] == l])} pruned")
+
+
+def adaptive_tran(path, gate, outputAT):
+    # Transient of a stage's MIS decks: stopped margin after the output's expected arrival, later
+    # side-input skews included, with a maximum step resolving the fastest edge seen on the path
+    # in slewSteps steps
+    tokens = path.header[path.netlist.tranLine - 2].split()
+    stop = min(float(tokens[2]), path.trigger + outputAT + path.adaptiveMargin + path.skewWindow)
+    slews = [stage.outputSlew for stage in path.gates if stage.outputSlew]
+    if slews:
+        tokens[-1] = f"{min(max(min(slews) / slewSteps, 1e-13), adaptiveMaxStep):.3e}"
+    tokens[2] = f"{stop:.6e}"
+    return " ".join(tokens) + "\n"
+
+def adaptive_deck(sim):
+    # Whether the sim runs its branch's adaptive transient
+    return any(tran and tran in sim[1] for tran in sim[0].trans)
+
+def output_delays(result):
+    # Output delays of a read_sim result, one per test of the deck
+    return [delay[0] if isinstance(delay, tuple) else delay for delay in (result if isinstance(result, list) else [result])]
+
+def fixed_sim(path, sim, tag):
+    # Twin of an adaptive sim with the path's own transient, run to its end without autostop
+    tran = path.header[path.netlist.tranLine - 2]
+    testLines = [tran if line.startswith(".tran") else line for line in sim[1] if line != ".option autostop\n"]
+    return tagged_sim((sim[0], testLines) + tuple(sim[2:]), tag)
+
+def adaptive_rerun(path, sims, results, parsed, offset):
+    # Adaptive decks that stopped before a target crossed (read as None) are rerun with the path's
+    # transient, and with --adaptive-check every adaptive deck is compared with that fixed-step run.
+    # Results and the sims' parsed logs from offset on are replaced by the reruns
+    adaptive = [idx for idx, sim in enumerate(sims) if adaptive_deck(sim)]
+    rerun = [idx for idx in adaptive if path.adaptiveCheck or None in output_delays(results[idx])]
+    if not rerun:
+        return
+    fixedParsed = []
+    fixedResults = sim_and_read_all(path, [fixed_sim(path, sims[idx], "Fixed") for idx in rerun], fixedParsed)
+    for idx, fixedResult, fixedDelays in zip(rerun, fixedResults, fixedParsed):
+        deck = deck_name(path, sims[idx])
+        if None in output_delays(results[idx]):
+            print(f"Adaptive transient of {deck} stopped early, rerun with the path's")
+            path.adaptiveReruns += 1
+            results[idx] = fixedResult
+            if parsed is not None:
+                parsed[offset + idx] = fixedDelays
+            continue
+        if None in output_delays(fixedResult):
+            continue
+        error = max(abs(delay - fixed) for delay, fixed in zip(output_delays(results[idx]), output_delays(fixedResult)))
+        path.adaptiveError = max(path.adaptiveError or 0.0, error)
+        if error > path.adaptiveTolerance:
+            print(f"WARNING: Adaptive transient of {deck} is {error * 1e12:.3f} ps off the fixed-step run")
+
+def skew_score(l, delay):
+    # Lower is worse for the branch: Speedup wants the earliest output, Slowdown the latest
+    return delay if l == 0 else -delay
+
+def skew_round(path, gate, searches, decks, names, tried, worstCases, replays, mainInputATs, stageNOutput):
+    # Simulate every deck's (search, skew) points and record the delays in tried
+    sims = []
+    for points, name in zip(decks, names):
+        l = searches[points[0][0]][0]
+        variants = []
+        for n, (idx, skew) in enumerate(points):
+            instanceLine = path.lines[searches[idx][1]].split()
+            variants.append((searches[idx][1], instanceLine, skew, "t_mis" + instanceLine[1].replace('/', '').lower() + "_k" + str(n) + "_delay"))
+        sims.append(mis_skew_testbench(path, worstCases[l], variants, mainInputATs[l], stageNOutput, gate, l, name, replays[l]))
+    for points, delays in zip(decks, sim_and_read_all(path, sims)):
+        for (idx, skew), delay in zip(points, delays):
+            # A failed measure reads as None
+            if delay is not None:
+                tried[idx][skew] = delay
+    path.skewSims += sum(len(points) for points in decks)
+
+def skew_search(path, gate, searches, worstCases, replays, mainInputATs, stageNOutput):
+    # Skew of every (branch, side-input source, aligned delay) search that makes the stage fastest
+    # for Speedup and slowest for Slowdown, within +-path.skewWindow. A grid of four skews brackets
+    # the best one in a deck per search, then golden-section narrows the bracket with each round's
+    # skews of a branch batched in one deck, path.skewBudget simulated skews per search in all.
+    # Returns (skew, delay) per search
+    golden = (5 ** 0.5 - 1) / 2
+    tried = [{0.0: delay} for l, j, delay in searches]
+    decks = []
+    for idx, (l, j, delay) in enumerate(searches):
+        low = -min(path.skewWindow, 0.9 * mainInputATs[l])
+        high = min(path.skewWindow, 0.9 * (gate.simTime - mainInputATs[l]))
+        decks.append([(idx, skew) for skew in (low, low / 2, high / 2, high)])
+    names = [path.lines[j].split()[1].replace('/', '') + "_Skew" for l, j, delay in searches]
+    skew_round(path, gate, searches, decks, names, tried, worstCases, replays, mainInputATs, stageNOutput)
+
+    # Golden-section inside the grid interval either side of the best skew so far
+    brackets = []
+    for idx, (l, j, delay) in enumerate(searches):
+        skews = sorted(tried[idx])
+        best = min(range(len(skews)), key=lambda k: skew_score(l, tried[idx][skews[k]]))
+        a, b = skews[max(best - 1, 0)], skews[min(best + 1, len(skews) - 1)]
+        brackets.append([a, b - golden * (b - a), a + golden * (b - a), b])
+    remaining = path.skewBudget - 4
+    rounds = 0
+    while remaining > 0:
+        points = []
+        for idx, (a, c, d, b) in enumerate(brackets):
+            l = searches[idx][0]
+            if rounds == 0:
+                # Both interior points first, one new point a round after that
+                points.extend([(idx, c), (idx, d)][:remaining])
+                continue
+            if c not in tried[idx] or d not in tried[idx]:
+                continue
+            if skew_score(l, tried[idx][c]) < skew_score(l, tried[idx][d]):
+                b, d = d, c
+                c = b - golden * (b - a)
+                points.append((idx, c))
+            else:
+                a, c = c, d
+                d = a + golden * (b - a)
+                points.append((idx, d))
+            brackets[idx] = [a, c, d, b]
+        if not points:
+            break
+        branches = sorted({searches[idx][0] for idx, skew in points})
+        decks = [[point for point in points if searches[point[0]][0] == l] for l in branches]
+        skew_round(path, gate, searches, decks, ["Skew" + str(rounds)] * len(decks), tried, worstCases, replays, mainInputATs, stageNOutput)
+        remaining -= 2 if rounds == 0 else 1
+        rounds += 1
+
+    results = []
+    for idx, (l, j, delay) in enumerate(searches):
+        skew = min(tried[idx], key=lambda skew: (skew_score(l, tried[idx][skew]), abs(skew)))
+        results.append((skew, tried[idx][skew]))
+    return results
+
+def mis_subset_testbench(path, overrides, instanceLines, stageNOutput, gate, l, replay=None):
+    # overrides switch every side input of instanceLines together, on top of the earlier winners
+    subCircuitLines = render_testbench(path, gate, overrides, True, replay, l)
+
+    sideInputInstance = "_".join(instanceLine[1].replace('/', '') for instanceLine in instanceLines)
+    testName = "t_mis" + sideInputInstance.lower() + "_delay"
+    subCircuitLines.extend(mis_measures(gate, testName, stageNOutput))
+    subCircuitLines.append(".plot tran v(" + gate.stage1Input + ") v(" + stageNOutput + ")\n.end\n")
+    subCircuitLines = autostop(path, gate, l, subCircuitLines)
+    return (gate, subCircuitLines, (testName), "MIS", sideInputInstance, l, False)
+
+def subset_search(path, gate, singles, wcInstances, misSims, misParsed, worstCases, replays, mainOutputATs, stageNOutput):
+    # Side inputs switching together. Per branch, a beam search over subsets of the side inputs whose
+    # own impact helps the branch, seeded and ordered by the singles' impacts of singles[l] =
+    # [(source line, instance line, pwl override, impact), ...]. Every round extends the beam's subsets
+    # by one side input and simulates the path.subsetBeam extensions whose summed single impacts
+    # promise the most, dropping any that can't beat the best subset even if impacts add up. Extensions
+    # that beat their parent form the next beam, path.subsets simulations per branch at most. A subset
+    # beating the single winner becomes the stage's worst case
+    for l in range(len(singles)):
+        helpful = sorted((single for single in singles[l] if (single[3] < 0 if l == 0 else single[3] > 0)),
+                         key=lambda single: skew_score(l, single[3]))
+        if len(helpful) < 2:
+            continue
+        single = {single[0]: single for single in helpful}
+        impacts = {frozenset([j]): single[j][3] for j in single}
+        best = frozenset([helpful[0][0]])
+        bestRun = None
+        beam = [frozenset([j]) for j in list(single)[:path.subsetBeam]]
+        spent = 0
+        while beam and spent < path.subsets:
+            extensions = {}
+            for subset in beam:
+                for j in single:
+                    extended = subset | {j}
+                    if j in subset or extended in impacts:
+                        continue
+                    estimate = impacts[subset] + single[j][3]
+                    if extended not in extensions or skew_score(l, estimate) < skew_score(l, extensions[extended][1]):
+                        extensions[extended] = (subset, estimate)
+            ranked = sorted((extended for extended in extensions if skew_score(l, extensions[extended][1]) < skew_score(l, impacts[best])),
+                            key=lambda extended: skew_score(l, extensions[extended][1]))
+            ranked = ranked[:min(path.subsetBeam, path.subsets - spent)]
+            if not ranked:
+                break
+            sims = []
+            for extended in ranked:
+                overrides = dict(worstCases[l])
+                overrides.update((j, single[j][2]) for j in sorted(extended))
+                sims.append((extended, overrides, mis_subset_testbench(path, overrides, [single[j][1] for j in sorted(extended)],
+                                                                       stageNOutput, gate, l, replays[l])))
+            parsed = []
+            delays = sim_and_read_all(path, [sim for extended, overrides, sim in sims], parsed)
+            spent += len(sims)
+            path.subsetSims += len(sims)
+            beam = []
+            for (extended, overrides, sim), delay, delayParsed in zip(sims, delays, parsed):
+                # A failed measure reads as None
+                if delay is None:
+                    continue
+                impacts[extended] = delay - mainOutputATs[l]
+                print("MIS_Subset at " + "+".join(single[j][1][1] for j in sorted(extended)) + ": " + f"{impacts[extended] * 1e12:.3f} ps")
+                if skew_score(l, impacts[extended]) < skew_score(l, impacts[extensions[extended][0]]):
+                    beam.append(extended)
+                if skew_score(l, impacts[extended]) < skew_score(l, impacts[best]):
+                    best = extended
+                    bestRun = (overrides, sim, delayParsed, delay)
+            beam = sorted(beam, key=lambda subset: skew_score(l, impacts[subset]))[:path.subsetBeam]
+        if bestRun is None:
+            continue
+        overrides, sim, delayParsed, delay = bestRun
+        instances = "+".join(single[j][1][1].replace('/', '') for j in sorted(best))
+        if l == 0:
+            gate.worstSpeedupImpact = impacts[best]
+            gate.wcSpeedupInstance  = instances
+            gate.wcAccSpeedup       = delay
+        else:
+            gate.worstSlowdownImpact = impacts[best]
+            gate.wcSlowdownInstance  = instances
+            gate.wcAccSlowdown       = delay
+        # The subset's deck and parsed run stand in for the single winner's
+        misSims.append(sim)
+        misParsed.append(delayParsed)
+        wcInstances[l] = (single[min(best)][1], overrides, len(misSims) - 1)
+        path.subsetWins += 1
+        print(f"Worst subset ({['Speedup', 'Slowdown'][l]}): {instances.replace('+', ', ')} at {impacts[best] * 1e12:.3f} ps")
+
+def mis_conditions(path, gate, l, instanceLine, mainInputAT):
+    # MIS table key and (input slew, output load, skew) point a side input is simulated at, None
+    # while the stage input's transition is unknown
+    if gate.inputTransitions[l] is None:
+        return None
+    rising, slew = gate.inputTransitions[l]
+    key = path.tables.key([gate.cell, gate.mainPin, "rise" if rising else "fall",
+                           instanceLine[1].split("/")[-1], "rise" if float(instanceLine[-1]) > 0 else "fall",
+                           gate.VDD, f"{path.trigger:.3e}", path.models, path.cellLibrary])
+    # The side input ramps from 0 to mainInputAT and the main input crosses VDD/2 at trigger + mainInputAT,
+    # skew is between their VDD/2 crossings. With the trigger in the key it also fixes the side input's ramp
+    skew = mainInputAT / 2 - (path.trigger + mainInputAT)
+    return key, (slew, gate.outputLoad, skew)
+
+def table_impacts(path, gate, candidates, mainInputATs):
+    # Side inputs the MIS tables answer, removed from the candidates, and the conditions of all of
+    # them so simulated ones can be added to the tables
+    answered = [{} for sources in candidates]
+    conditions = [{} for sources in candidates]
+    for l, sources in enumerate(candidates):
+        for j in sources:
+            conditions[l][j] = mis_conditions(path, gate, l, path.lines[j].split(), mainInputATs[l])
+            if conditions[l][j] is not None:
+                impact = path.tables.lookup(*conditions[l][j])
+                if impact is not None:
+                    answered[l][j] = impact
+    path.tableHits += sum(len(branch) for branch in answered)
+    return [[j for j in sources if j not in answered[l]] for l, sources in enumerate(candidates)], answered, conditions
+
+
+class netlistData:
+    # One pass over a path netlist from write_path_spice, indexing every line the testbenches are
+    # assembled from, so nothing is searched for again per stage or per simulation
+    def __init__(self, lines):
+        self.lines = lines
+
+        self.includeLines   = []
+        self.tranLine       = None
+        self.printLines     = []            # .print and its + continuations
+        self.pwlLine        = None          # stage 1 input stimulus
+        self.stageInstances = OrderedDict() # stage number -> xstage instance line
+        self.stageBlocks    = OrderedDict() # stage number -> (first line, .subckt line, .ends line)
+        self.gateLines      = []            # "* Gate" headers
+        self.gateStages     = {}            # gate line -> stage number
+        self.sourceLines    = {}            # gate line -> voltage sources of the gate
+        self.headerEnd      = len(lines)
+        self.tailStart      = len(lines)
+
+        blockStart = None
+        subcktLine = None
+        gateLine   = None
+        for idx, text in enumerate(lines):
+            tokens = text.split()
+            if not tokens:
+                continue
+            head = tokens[0].lower()
+            if head == ".subckt":
+                if blockStart is None:
+                    blockStart = self.headerEnd = idx
+                subcktLine = idx
+            elif head == ".ends" and subcktLine is not None:
+                stage = int(re.search(r'(\d+)$', lines[subcktLine].split()[1]).group(1))
+                self.stageBlocks[stage] = (blockStart, subcktLine, idx)
+                if gateLine is not None:
+                    self.gateStages[gateLine] = stage
+                blockStart = self.tailStart = idx + 1
+                subcktLine = None
+                gateLine   = None
+            elif subcktLine is not None:
+                if text.startswith("* Gate"):
+                    gateLine = idx
+                    self.gateLines.append(idx)
+                    self.sourceLines[idx] = []
+                elif text.startswith("* Load pins"):
+                    # Sources past the load pins don't belong to the gate
+                    self.sourceLines.get(gateLine, []).append(None)
+                elif gateLine is not None and head.startswith("v") and None not in self.sourceLines[gateLine]:
+                    self.sourceLines[gateLine].append(idx)
+            elif head in (".include", ".lib"):
+                self.includeLines.append(idx)
+            elif head == ".tran":
+                self.tranLine = idx
+            elif head == ".print":
+                self.printLines = [idx]
+            elif head.startswith("+") and self.printLines and self.printLines[-1] == idx - 1:
+                self.printLines.append(idx)
+            elif re.match(r'xstage\d+$', head):
+                self.stageInstances[int(head[6:])] = idx
+            elif self.pwlLine is None and "pwl" in text:
+                self.pwlLine = idx
+        for gateLine, sources in self.sourceLines.items():
+            if None in sources:
+                sources.remove(None)
 
 
 class stageData:
-    def locateFeatureIdx(self, begin, end, substring):
-        return next(
-            (idx for idx, txt in enumerate(lines[begin:end], start=begin)
-            if substring in txt.lstrip()),
-            None
-        )
-
-    def __init__(self, lines, gateIdx):
+    def __init__(self, path, gateIdx):
+        netlist = path.netlist
+        lines = netlist.lines
         self.criticalNets = criticalDefaults[:]
         self.sideInputs   = []
         
         # Lines for navigating Gate
         self.gateLine = gateIdx
         self.netListLine = self.gateLine + 1
-        
-        self.beginNetInstances = self.gateLine + 2
-        self.endNetInstances = self.locateFeatureIdx(self.netListLine, None, "* Load pins") - 2
-        
-        self.endsLine = self.locateFeatureIdx(self.gateLine, None, ".ends")
+        self.sourceLines = netlist.sourceLines[gateIdx]
 
-        self._extra_print_line = False
+        self.stageNumber = netlist.gateStages[gateIdx]
+        blockStart, self.subcktLine, self.endsLine = netlist.stageBlocks[self.stageNumber]
 
         # Critical Net Data
         # Record the subcircuit input and output nets
@@ -259,23 +1231,32 @@ class stageData:
             if all(crit not in net for crit in self.criticalNets):
                 if net not in self.sideInputs:
                     self.sideInputs.append(net)
-                    simData[net] = [net]
+                    path.simData[net] = [net]
+        # Sources driving the side inputs, in netlist order
+        self.sideInputSources = [idx for idx in self.sourceLines if lines[idx].split()[1] in self.sideInputs]
 
         # Stage Simulation Data
-        self.simTimePct = 1.1
-        self.simTime = float(lines[self.locateFeatureIdx(0, None, "pwl") + 3].split()[0]) * self.simTimePct
-        self.stage1Input = lines[self.locateFeatureIdx(0, None, "xstage1")].strip().split()[1]
-        self.stage1Vi = float(lines[self.locateFeatureIdx(0, None, "pwl") + 1].strip().split()[-1])
-        self.stageNum = lines[self.gateLine - 1].split(" ")[1]
+        self.simTimePct = path.simTimePct
+        self.simTime = path.simTime
+        self.stage1Input = lines[netlist.stageInstances[1]].strip().split()[1]
+        self.stage1Vi = float(lines[netlist.pwlLine + 1].strip().split()[-1])
+        self.stageNum = lines[self.subcktLine].split()[1]
 
-        self.finalOutput = lines[self.locateFeatureIdx(0, None, ".print")].strip().split()[-2].strip("v()")
+        self.finalOutput = lines[netlist.printLines[0]].strip().split()[-2].strip("v()")
 
-        nextStageNum = self.locateFeatureIdx(0, None,
-                                       "stage" + str(int(self.stageNum[-1]) + 1))
-        if nextStageNum is not None:
-            self.netToCommentOut = lines[nextStageNum].split()[2]
-        else:
-            self.netToCommentOut = ""
+        self.outputSlew = None
+        self.outputRising = None
+
+        # Cell, switching pin and output capacitance the MIS tables are indexed by, and each branch's
+        # (rising, slew) at the stage input once its SIS run measured it
+        self.cell = lines[self.netListLine].split()[-1]
+        self.mainPin = self.criticalNets[-2].split("/")[-1]
+        self.outputLoad = sum(spice_number(lines[idx].split()[3]) for idx in range(self.subcktLine + 1, self.endsLine)
+                              if lines[idx][:1] in "Cc" and len(lines[idx].split()) > 3)
+        self.inputTransitions = [None, None]
+
+        # Each branch's transient for the stage's MIS decks, None runs the path's
+        self.trans = [None, None]
 
         # Initialize worst case
         self.worstSpeedupImpact  = None
@@ -285,193 +1266,1044 @@ class stageData:
         self.wcAccSlowdown       = None
         self.wcAccSpeedup        = None
 
-        self.VDD = lines[self.locateFeatureIdx(self.beginNetInstances+1, None, "/VPWR")].split()[-1]
-        self.GND = lines[self.locateFeatureIdx(self.beginNetInstances+1, None, "/VGND")].split()[-1]
-
-        
-# Nets to ignore
-criticalDefaults = ["/VGND", "/VNB", "/VPB", "/VPWR"]
-gates = []
-simData      = OrderedDict()
-
-subcktFile = sys.argv[1]
-models = '.lib "' + str(os.path.expanduser("~")) + '/.volare/sky130A/libs.tech/ngspice/sky130.lib.spice" tt\n'
-cellLibrary = '.include "' + str(os.path.expanduser("~")) + '/.volare/sky130A/libs.ref/sky130_fd_sc_hd/spice/sky130_fd_sc_hd.spice"\n'
-includes = {".option noaskquit\n", models, cellLibrary}
-workingPath = sys.argv[1].split(".")[0]
-
-verbose = False
-
-# Clean Method
-if "--clean" in sys.argv:
-    subprocess.run("rm subcircuits/*IS*", shell=True, check=True)
-    sys.exit()
-
-# verbose mode
-if "--v" in sys.argv:
-    verbose = True
-
-if "--so" in sys.argv:
-    # Find the index of '--so'
-    so_index = sys.argv.index('--so')
-    # Check if there's an element after '--so'
-    if so_index + 1 < len(sys.argv):
-        # Try to convert it to a number
-        number_str = sys.argv[so_index + 1]
-        startingOffset = float(number_str) # Or float(number_str)
-        print(str("Initial time: " + str(startingOffset)))
-    else:
-        print("Error: --so token found, but no number followed.")
-        sys.exit(1)
-
-# Otherwise take spice file from command line
-with open(subcktFile, 'r') as data_file:
-    lines = data_file.readlines()
-
-i = 0
-wcSpeedupLines = []
-wcSlowdownLines = []
-worstCases = []
-worstCases.extend([wcSpeedupLines, wcSlowdownLines])
-mainInputATs  = [None, None]
-mainOutputATs = [None, None]
-measureLines = []
-originalAT = None
-# Iterate over each line of the subcircuit
-while i < len(lines):
-    line = lines[i].strip()
-
-    if line.startswith("* Gate"):
+        supplies = {lines[idx].split()[1].split("/")[-1]: lines[idx].split()[-1] for idx in self.sourceLines}
+        self.VDD = supplies.get("VPWR", "0")
+        self.GND = supplies.get("VGND", "0")
+
+
+class simCache:
+    # On-disk store of parsed delays keyed by everything that determines a simulation result:
+    # the deck text, the identity of every file it includes, the ngspice version and how the
+    # results were parsed, so an entry read with waveforms is never answered by one without.
+    # Entries are small JSON files, least recently used ones are evicted past maxBytes
+    version = 3
+
+    def __init__(self, cacheDir, maxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        os.makedirs(cacheDir, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(cacheDir) if entry.name.endswith(".json"))
+
+    @staticmethod
+    def identity(includeLines):
+        # Size and modification time of the model, cell library and path subckt files the lines
+        # include, computed once per path and passed to every key
+        files = []
+        for line in includeLines:
+            match = re.match(r'\s*\.(?:lib|include)\s+"?([^"\s]+)"?', line, re.IGNORECASE)
+            if match:
+                try:
+                    stat = os.stat(match.group(1))
+                    files.append(f"{os.path.abspath(match.group(1))} {stat.st_size} {stat.st_mtime_ns}\n")
+                except OSError:
+                    files.append(f"{match.group(1)} missing\n")
+        return "".join(files)
+
+    def key(self, testLines, mode="", includes=""):
+        # mode names what the parse kept besides the delays, e.g. "raw waves", includes is the
+        # identity of the files the deck includes
+        digest = hashlib.sha256()
+        digest.update(f"{self.version}\n{ngspice_version()}\n{mode}\n{includes}".encode())
+        digest.update("".join(testLines).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        entryFile = os.path.join(self.cacheDir, key + ".json")
+        try:
+            with open(entryFile) as f:
+                entry = json.load(f)
+            # Mark as recently used
+            os.utime(entryFile)
+        except (OSError, ValueError):
+            return None
+        return {name: tuple(delays) for name, delays in entry.items()}
+
+    def put(self, key, delays):
+        entryFile = os.path.join(self.cacheDir, key + ".json")
+        # Write then rename so concurrent paths never read a partial entry
+        tmpFile = entryFile + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmpFile, "w") as f:
+            json.dump(delays, f)
+        os.replace(tmpFile, entryFile)
+        self.size += os.path.getsize(entryFile)
+        if self.size > self.maxBytes:
+            self.trim()
+
+    def trim(self):
+        # Evict the least recently used entries down to 90% of the limit
+        entries = []
+        for entry in os.scandir(self.cacheDir):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+        self.size = sum(size for mtime, size, entryFile in entries)
+        for mtime, size, entryFile in entries:
+            if self.size <= self.maxBytes * 0.9:
+                break
+            try:
+                os.remove(entryFile)
+            except OSError:
+                pass
+            self.size -= size
+
+
+class misTable:
+    # MIS impacts characterized per cell, switching pin and direction, side pin and direction and
+    # stimulus, as points over (input slew, output load, skew) filled lazily from simulations.
+    # Each key is an append-only JSON lines file, so concurrent paths share points as they find them
+    version = 1
+    # Neighbourhood of a lookup per dimension: slew, load, skew
+    steps = (5e-12, 1e-15, 5e-12)
+    # Fraction of a step within which a dimension counts as matched without bracketing points
+    tolerance = 0.1
+
+    def __init__(self, tableDir):
+        self.tableDir = tableDir
+        os.makedirs(tableDir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.points = {}    # key -> (bytes read, [[point, impact], ...])
+
+    def key(self, fields):
+        return hashlib.sha256(json.dumps([self.version] + fields).encode()).hexdigest()
+
+    def load(self, key):
+        tableFile = os.path.join(self.tableDir, key + ".jsonl")
+        with self.lock:
+            try:
+                size = os.path.getsize(tableFile)
+            except OSError:
+                return []
+            if key in self.points and self.points[key][0] == size:
+                return self.points[key][1]
+            points = []
+            with open(tableFile) as f:
+                for line in f:
+                    try:
+                        points.append(json.loads(line))
+                    except ValueError:
+                        # Line still being appended by another path
+                        continue
+            self.points[key] = (size, points)
+            return points
+
+    def lookup(self, key, point):
+        # Impact at point interpolated from the points around it, None outside the characterized range
+        near = [(p, impact) for p, impact in self.load(key)
+                if all(abs(p[d] - point[d]) <= step for d, step in enumerate(self.steps))]
+        if not near:
+            return None
+        for d, step in enumerate(self.steps):
+            offsets = [p[d] - point[d] for p, impact in near]
+            if min(abs(offset) for offset in offsets) > step * self.tolerance and not min(offsets) < 0 < max(offsets):
+                return None
+        # Inverse squared distance in steps, a characterized point answers for itself
+        weights = []
+        for p, impact in near:
+            distance = sum(((p[d] - point[d]) / step) ** 2 for d, step in enumerate(self.steps))
+            if distance < 1e-12:
+                return impact
+            weights.append((1 / distance, impact))
+        return sum(weight * impact for weight, impact in weights) / sum(weight for weight, impact in weights)
+
+    def add(self, key, point, impact):
+        # One short append per point, atomic against other paths appending to the same key
+        with open(os.path.join(self.tableDir, key + ".jsonl"), "a") as f:
+            f.write(json.dumps([list(point), impact]) + "\n")
+
+
+def scratch_root():
+    # RAM-backed temporary directory when there is one
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class simWorkspace:
+    # Where a path's decks, logs and rawfiles are written. With keep every file stays next to the
+    # path like before. Otherwise they go to a scratch directory, in RAM where possible, that is
+    # emptied after every stage, and only the worst-case decks and their logs are kept next to the path
+    def __init__(self, workingPath, keep=False, scratchDir=None):
+        self.workingPath = workingPath
+        self.scratch = None
+        if not keep:
+            self.scratch = tempfile.mkdtemp(prefix=os.path.basename(workingPath) + "_", dir=scratchDir or scratch_root())
+        # Prefix of every deck, log and rawfile name
+        self.base = os.path.join(self.scratch, os.path.basename(workingPath)) if self.scratch else workingPath
+
+    def persist(self, spice_file, testLines, log_file=None):
+        # The deck from memory, and its log and rawfile when given, written next to the path
+        if not self.scratch:
+            return
+        target = os.path.dirname(self.workingPath)
+        with open(os.path.join(target, os.path.basename(spice_file)), "w") as f:
+            f.writelines(testLines)
+        for simFile in ([log_file, raw_file_of(log_file)] if log_file else []):
+            if os.path.exists(simFile):
+                shutil.copyfile(simFile, os.path.join(target, os.path.basename(simFile)))
+
+    def clear(self):
+        if not self.scratch:
+            return
+        for name in os.listdir(self.scratch):
+            try:
+                os.remove(os.path.join(self.scratch, name))
+            except OSError:
+                pass
+
+    def close(self):
+        if self.scratch:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+class ngspiceSession:
+    # One long-lived ngspice in pipe mode. Decks are sourced, run and removed over stdin, so
+    # process start-up and initialization are paid once instead of for every measurement
+    sentinel = "@@mis_sim_done@@"
+
+    def __init__(self):
+        command = ["ngspice", "-p"]
+        if shutil.which("stdbuf"):
+            # Line buffer ngspice's stdout so each run's output arrives before its sentinel
+            command = ["stdbuf", "-oL"] + command
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, text=True, bufsize=1)
+        self.send("set noaskquit\n")
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def send(self, commands):
+        try:
+            self.process.stdin.write(commands)
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            raise OSError("ngspice session exited")
+
+    def run(self, spice_file, log_file, controlled=False, raw_file=None, timeout=0, printNets=None):
+        # Whether the deck ran out of time. The session is then killed and the pool replaces it
+        # Sourcing a deck with a .control block already runs its analyses. Unlike a batch run, the
+        # session doesn't print the deck's .print vectors after run, printNets asks for them
+        self.send("source " + os.path.abspath(spice_file) + "\n" + ("" if controlled else "run\n")
+                  + ("print " + " ".join(printNets) + "\n" if printNets else "")
+                  + ("write " + os.path.abspath(raw_file) + "\n" if raw_file else "")
+                  + "remcirc\ndestroy all\necho " + self.sentinel + "\n")
+        expired = threading.Event()
+        def expire():
+            expired.set()
+            self.process.kill()
+        timer = threading.Timer(timeout, expire) if timeout else None
+        if timer:
+            timer.start()
+        output = []
+        try:
+            for line in self.process.stdout:
+                if line.strip() == self.sentinel:
+                    break
+                output.append(line)
+            else:
+                if not expired.is_set():
+                    raise OSError("ngspice session exited")
+        finally:
+            if timer:
+                timer.cancel()
+        # Same log the batch run would have written, so parsing doesn't care which ran it
+        with open(log_file, "w") as f:
+            f.writelines(output)
+        return expired.is_set()
+
+    def close(self):
+        try:
+            self.send("quit\n")
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class sessionPool:
+    # Up to size warm ngspice sessions shared by the simulations of an analysis
+    def __init__(self, size):
+        self.size     = size
+        self.sessions = []
+        self.idle     = queue.LifoQueue()
+        self.lock     = threading.Lock()
+
+    def acquire(self):
+        # None when ngspice can't be started in pipe mode
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.sessions) < self.size:
+                try:
+                    session = ngspiceSession()
+                except OSError:
+                    return None
+                self.sessions.append(session)
+                return session
+        return self.idle.get()
+
+    def release(self, session):
+        if not session.alive():
+            # Replace a session that died so waiters are not starved
+            with self.lock:
+                self.sessions.remove(session)
+                try:
+                    session = ngspiceSession()
+                    self.sessions.append(session)
+                except OSError:
+                    session = None
+        self.idle.put(session)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+
+
+class threadOutput:
+    # sys.stdout stand-in sending the prints of each thread that registered a buffer to that buffer,
+    # and everything else to the console, so analyses running side by side keep separate reports
+    def __init__(self, console):
+        self.console = console
+        self.buffers = {}   # thread ident -> buffer
+
+    def write(self, text):
+        return self.buffers.get(threading.get_ident(), self.console).write(text)
+
+    def flush(self):
+        self.buffers.get(threading.get_ident(), self.console).flush()
+
+
+class simProfile:
+    # Chrome trace (chrome://tracing, Perfetto) of every build, write, simulate and parse, and one
+    # record per simulation for the histograms and slowest list written with it
+    phases = ("build", "write", "simulate", "parse")
+    # Histogram bucket upper bounds in milliseconds
+    buckets = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000, 10000, 30000, float("inf"))
+
+    def __init__(self):
+        self.events = []
+        self.sims = []
+        self.lock = threading.Lock()
+
+    def add(self, phase, start, args, end=None):
+        end = time.time() if end is None else end
+        event = {"name": phase, "cat": phase, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def sim(self, path, sim, spice_file, wall, cpu, parse):
+        gate, testLines, testName, delayType, sideInputInstance, l, partial = sim
+        with self.lock:
+            self.sims.append({
+                "path":      path.pathName,
+                "stage":     gate.stageNum,
+                "sideInput": sideInputInstance,
+                "branch":    ["Speedup", "Slowdown"][l] if l in (0, 1) else "Original",
+                "type":      delayType,
+                "deck":      os.path.basename(spice_file),
+                "deckBytes": sum(len(line) for line in testLines),
+                "cached":    wall is None,
+                "simWall":   wall,
+                "simCPU":    cpu,
+                "parse":     parse,
+            })
+
+    def merge(self, other):
+        self.events.extend(other["events"])
+        self.sims.extend(other["sims"])
+
+    def export(self):
+        return {"events": self.events, "sims": self.sims}
+
+    def summary(self, top=10):
+        histograms = {}
+        for phase in self.phases:
+            counts = [0] * len(self.buckets)
+            for event in self.events:
+                if event["name"] == phase:
+                    counts[next(idx for idx, bound in enumerate(self.buckets) if event["dur"] / 1e3 <= bound)] += 1
+            histograms[phase] = [{"le_ms": bound if bound != float("inf") else None, "count": count}
+                                 for bound, count in zip(self.buckets, counts)]
+        totals = {phase: sum(event["dur"] for event in self.events if event["name"] == phase) / 1e6 for phase in self.phases}
+        simulated = [sim for sim in self.sims if not sim["cached"]]
+        return {
+            "sims":       len(self.sims),
+            "simulated":  len(simulated),
+            "totals_s":   totals,
+            "histograms": histograms,
+            "slowest":    sorted(simulated, key=lambda sim: sim["simWall"], reverse=True)[:top],
+        }
+
+    def write(self, traceFile, top=10):
+        summary = self.summary(top)
+        with open(traceFile, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms", "otherData": summary}, f)
+        return summary
+
+def print_profile(summary, traceFile):
+    print(f"Profile: {summary['simulated']} of {summary['sims']} sims simulated, trace in {traceFile}")
+    print("  " + ", ".join(f"{phase} {seconds:.3f} s" for phase, seconds in summary["totals_s"].items()))
+    for phase, histogram in summary["histograms"].items():
+        counts = [bucket for bucket in histogram if bucket["count"]]
+        if counts:
+            print(f"  {phase:<9}" + "  ".join(("<=" + f"{bucket['le_ms']:g}" if bucket["le_ms"] is not None else ">30000")
+                                            + f"ms: {bucket['count']}" for bucket in counts))
+    if summary["slowest"]:
+        print("  Slowest simulations:")
+        for sim in summary["slowest"]:
+            cpu = f"{sim['simCPU']:.3f} s CPU" if sim["simCPU"] is not None else "session"
+            print(f"    {sim['simWall']:.3f} s ({cpu}, parse {sim['parse'] * 1e3:.1f} ms, {sim['deckBytes'] / 1e3:.1f} kB)  {sim['deck']}")
+
+
+@functools.lru_cache(maxsize=None)
+def ngspice_version():
+    try:
+        return subprocess.run(["ngspice", "-v"], capture_output=True, text=True, stdin=subprocess.DEVNULL).stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+class pathData:
+    # Everything one path analysis reads or accumulates, so several paths can be analyzed
+    # in one interpreter. Every option is passed by keyword
+    def __init__(self, subcktFile, *, verbose=False, jobs=1, simSlots=None, cache=None, sessions=None, sweep=False,
+                 replay=False, replayCheck=False, raw=False, profile=None, prune=0, pruneMargin=1.0, pruneCheck=False,
+                 tables=None, skewWindow=0.0, skewBudget=8, adaptive=False, adaptiveMargin=50.0, adaptiveCheck=False,
+                 adaptiveTolerance=0.5, scratchDir=None, corner=None, subsets=0, subsetBeam=2, simTimeout=600.0, retries=2):
+        self.subcktFile  = subcktFile
+        self.workingPath = os.path.splitext(subcktFile)[0]
+        self.pathName    = os.path.basename(self.workingPath)
+
+        # (model corner, supply or None, temperature or None), None keeps the netlist's supply at tt
+        self.corner     = corner
+        self.cornerName = corner_name(corner) if corner else None
+
+        self.verbose  = verbose
+        self.jobs     = jobs
+        self.simSlots = simSlots
+
+        # Kill simulations after simTimeout seconds (0 never) and retry failed ones up to retries times
+        # with relaxed options, listing those that still fail
+        self.simTimeout  = simTimeout
+        self.retries     = retries
+        self.simRetries  = 0
+        self.simFailures = []
+        self.retriedSims = {}   # deck name: the last retry of the sim
+
+        self.sessions = sessions
+        self.sweep    = sweep
+
+        # Replay recorded stage inputs instead of simulating the path prefix, optionally checked
+        # against the full prefix
+        self.replay      = replay or replayCheck
+        self.replayCheck = replayCheck
+        self.replayError = None
+
+        # Read delays from binary rawfiles instead of the text log
+        self.raw = raw
+
+        # simProfile recording every simulation, or None
+        self.profile = profile
+
+        # Fully simulate only the best prune side inputs of a branch by a coarse estimate, margin in ps
+        self.prune       = prune
+        self.pruneMargin = pruneMargin * 1e-12
+        self.pruneCheck  = pruneCheck and prune > 0
+        self.coarseSims  = 0
+        self.simsPruned  = 0
+        self.pruneMisses = 0
+
+        self.cache       = cache
+        self.cacheHits   = 0
+        self.cacheMisses = 0
+
+        # Search each side input's worst skew within +-skewWindow ps, skewBudget simulated skews each
+        self.skewWindow  = skewWindow * 1e-12
+        self.skewBudget  = skewBudget
+        self.skewSims    = 0
+
+        # Stop MIS decks adaptiveMargin ps after the expected output arrival with a step sized by the
+        # slews, optionally checked against the fixed-step run within adaptiveTolerance ps
+        self.adaptive          = adaptive or adaptiveCheck
+        self.adaptiveMargin    = adaptiveMargin * 1e-12
+        self.adaptiveCheck     = adaptiveCheck
+        self.adaptiveTolerance = adaptiveTolerance * 1e-12
+        self.adaptiveError     = None
+        self.adaptiveReruns    = 0
+
+        # Search subsets of side inputs switching together, subsets simulations per stage and branch
+        # with subsetBeam subsets extended a round
+        self.subsets    = subsets
+        self.subsetBeam = max(subsetBeam, 1)
+        self.subsetSims = 0
+        self.subsetWins = 0
+
+        # misTable answering side inputs inside the characterized range, or None
+        self.tables      = tables
+        self.tableHits   = 0
+        self.tablePoints = 0
+
+        self.models      = corner_models(corner) if corner else models
+        self.cellLibrary = cellLibrary
+
+        self.gates   = []
+        self.simData = OrderedDict()
+
+        with open(subcktFile, 'r') as data_file:
+            self.lines = data_file.readlines()
+        self.netlist = netlistData(self.lines)
+        if corner and corner[1] is not None:
+            self.lines = corner_supply(self.lines, self.netlist, corner[1])
+            self.netlist = netlistData(self.lines)
+
+        # Extend duration of the stimulus by percentage, every testbench shares the header
+        self.simTimePct = 1.1
+        self.simTime = float(self.lines[self.netlist.pwlLine + 3].split()[0]) * self.simTimePct
+        self.header = lint_header(self)
+        # Every deck includes the models, the cell library and the header's includes, their
+        # identity keys the cache without scanning each deck for them
+        self.includeIdentity = simCache.identity([self.models, self.cellLibrary] +
+                                                 [self.header[idx - 2] for idx in self.netlist.includeLines if idx >= 2]) if cache else ""
+
+        # Time the stimulus crosses half its swing, where every measure triggers
+        stimulus = [[float(x) for x in self.lines[idx][1:].split()] for idx in range(self.netlist.pwlLine + 1, self.netlist.pwlLine + 4)]
+        level = max(abs(v) for t, v in stimulus) / 2
+        self.trigger = next((t0 + (level - v0) * (t1 - t0) / (v1 - v0) for (t0, v0), (t1, v1) in zip(stimulus, stimulus[1:])
+                             if (v0 - level) * (v1 - level) <= 0 and v0 != v1), 0.0)
+
+        # Simulation files live in RAM unless verbose keeps them all, corners of a path get their own
+        # names. Created last, so a netlist that fails to load leaves no scratch directory behind
+        self.workspace = simWorkspace(self.workingPath + ("_" + self.cornerName if corner else ""), verbose, scratchDir)
+
+
+def analyze_path(subcktFile, startingOffset=0.0, **options):
+    # options are pathData's keyword arguments
+    path = pathData(subcktFile, **options)
+    if path.corner:
+        print("Corner: " + path.cornerName)
+    try:
+        return analyze_stages(path, startingOffset)
+    finally:
+        path.workspace.close()
+
+def analyze_stages(path, startingOffset):
+    subcktFile = path.subcktFile
+    lines = path.lines
+    gates = path.gates
+    simData = path.simData
+
+    # Lines every worst-case deck changes from the netlist, 0 is Speedup, 1 is Slowdown
+    worstCases = [{}, {}]
+    # Recorded input of the first stage each branch still simulates, None simulates from stage 1
+    replays = [None, None]
+    mainInputATs  = [None, None]
+    mainOutputATs = [None, None]
+    originalAT = None
+    # Iterate over each gate of the subcircuit
+    for gateIdx in path.netlist.gateLines:
         # Characterize Gate Information
-        gate = stageData(lines, i)
+        gate = stageData(path, gateIdx)
         gates.append(gate)
-        # initialize spice file lines for new gate
-        subCircuitLines   = []
-        measureLines  = [] 
 
         # Measure SIS delay from start of stage 1, to end of current stage
         if gate.sideInputs:
             print(gate.stageNum)
             # If first Side input stage, perform initial SIS measurement
-            if (sum(1 for stage in gates if stage.worstSpeedupImpact) < 1 or sum(1 for stage in gates if stage.worstSlowdownImpact) < 1) and len(measureLines) == 0 :
+            if sum(1 for stage in gates if stage.worstSpeedupImpact) < 1 or sum(1 for stage in gates if stage.worstSlowdownImpact) < 1:
                 # Measure total SIS output delay
-                originalAT  = measure_sis_delay(gate, measureLines, line, lines, False, True, None)
+                originalAT  = measure_sis_delay(path, gate, {}, False, None)
                 print(f"SIS Delay at last stage: {originalAT * 1e12:.3f} ps")
-                measureLines  = []
-                mainOutputAT, mainInputAT, stageNOutput = measure_sis_delay(gate, measureLines, line, lines, True, True, None)
+                mainOutputAT, mainInputAT, stageNOutput = measure_sis_delay(path, gate, {}, True, None)
                 print(f"SIS Delay to main input: {mainInputAT * 1e12:.3f} ps")
                 print(f"SIS Delay to gate output: {mainOutputAT * 1e12:.3f} ps")
                 for l in range(len(worstCases)):
-                    worstCases[l]   = measureLines
+                    worstCases[l]    = {}
+                    replays[l]       = None
                     mainInputATs[l]  = mainInputAT
                     mainOutputATs[l] = mainOutputAT
-                
+
             else:
                 for l in range(len(worstCases)):
-                    measureLines = []
-                    measureLines = list(worstCases[l][:locateFeatureIdx(worstCases[l], 0, None, ".measure") + 1])
-                    measureLines[-1] = "\n"
-                    measureLines.extend(lines[gate.gateLine - 1: gate.endsLine + 1])
-
-                    mainOutputATs[l], mainInputATs[l], stageNOutput = measure_sis_delay(gate, measureLines, line, lines, True, False, l)
+                    mainOutputATs[l], mainInputATs[l], stageNOutput = measure_sis_delay(path, gate, worstCases[l], True, l, replays[l])
                     print(f"SIS Delay to main input: {mainInputATs[l] * 1e12:.3f} ps")
                     print(f"SIS Delay to gate output: {mainOutputATs[l] * 1e12:.3f} ps")
-
-
-
-            # Advance to instances
-            i = gate.beginNetInstances
-
-            # 0 is Speedup, 1 is Slowdown
+                    if path.replayCheck and replays[l]:
+                        fullSim, _ = sis_testbench(path, gate, worstCases[l], True, l)
+                        replay_check(path, [tagged_sim(fullSim, "Prefix")], [(mainOutputATs[l], mainInputATs[l])])
+
+            if path.adaptive:
+                gate.trans = [adaptive_tran(path, gate, outputAT) for outputAT in mainOutputATs]
+                for l, tran in enumerate(gate.trans):
+                    tokens = tran.split()
+                    print(f"Adaptive transient ({['Speedup', 'Slowdown'][l]}): stop {float(tokens[2]) * 1e12:.3f} ps, max step {float(tokens[-1]) * 1e12:.3f} ps")
+
+            # Every MIS testbench of the stage only depends on worstCases and mainInputATs,
+            # so build them all first and simulate them together
+            misSims = []
+            misInstances = []
+            prefixSims = []
+            # Side inputs each branch simulates, all of them unless the MIS tables answer some
+            # or --prune ranks them first
+            candidates = [list(gate.sideInputSources) for l in range(len(worstCases))]
+            answered = [{}, {}]
+            conditions = [{}, {}]
+            if path.tables:
+                candidates, answered, conditions = table_impacts(path, gate, candidates, mainInputATs)
+            if path.prune:
+                candidates, pruned = prune_candidates(path, gate, candidates, worstCases, replays, mainInputATs, mainOutputATs, stageNOutput)
             for l in range(len(worstCases)):
-                # For all side inputs in instances, measure the MIS delay
-                for j in range(gate.beginNetInstances, gate.endNetInstances + 1):
+                # Side inputs the tables didn't answer are measured, one deck each or one sweep deck
+                simulated = [j for j in gate.sideInputSources if j in candidates[l] and j not in answered[l]]
+                firstSim = len(misSims)
+                misSims.extend(mis_sims(path, gate, simulated, worstCases, l, replays[l], mainInputATs[l], stageNOutput))
+                if path.replayCheck and replays[l]:
+                    prefixSims.extend(tagged_sim(sim, "Prefix") for sim in mis_sims(path, gate, simulated, worstCases, l, None, mainInputATs[l], stageNOutput))
+                for j in gate.sideInputSources:
+                    if j not in answered[l] and j not in simulated:
+                        continue
                     instanceLine = lines[j].strip().split()
 
-                    if not instanceLine:
-                        continue
-                    if instanceLine[0].lower().startswith('v') and instanceLine[1] in gate.sideInputs:
-                        instanceName = " ".join(instanceLine[:-1])
-                        finalV       = instanceLine[-1]
-
-
-                        # Append voltage data to dictionary
-                        simData[instanceLine[1]].extend(instanceLine[-2:])
-                        # Grab entire circuit up to
-                        subCircuitLines = list(worstCases[l][:locateFeatureIdx(worstCases[l], 0, None, ".measure") + 1])
-                        
-
-                        misDelay = measure_mis_delay(subCircuitLines, finalV, instanceName, mainInputATs[l], gate, line, lines, instanceLine, j, l)
-                        
-                        
-                        impact = float(misDelay) - float(mainOutputATs[l])
-                        simData[instanceLine[1]].append(impact)
-                        print("MIS_Impact at " + instanceLine[1] + ": " + f"{impact * 1e12:.3f} ps")
-
-                        # track per-gate worst case on the fly
-                        impact  = misDelay - mainOutputATs[l]        # signed Δ-delay for this side-input
-
-                        # ----- keep the two branches independent -----
-                        if l == 0:                # SPEED-UP branch (we want the most-negative impact)
-                            if impact < 0:
-                                if (gate.worstSpeedupImpact is None) or (impact < gate.worstSpeedupImpact):
-                                    gate.worstSpeedupImpact = impact
-                                    gate.wcSpeedupInstance  = instanceLine[1].replace('/', '')
-                                    gate.wcAccSpeedup       = misDelay
-
-                        else:                      # SLOW-DOWN branch (we want the most-positive impact)
-                            if impact > 0:
-                                if (gate.worstSlowdownImpact is None) or (impact > gate.worstSlowdownImpact):
-                                    gate.worstSlowdownImpact = impact
-                                    gate.wcSlowdownInstance  = instanceLine[1].replace('/', '')
-                                    gate.wcAccSlowdown       = misDelay
+                    # Winners of earlier stages, plus this side input switching with the main input
+                    overrides = dict(worstCases[l])
+                    overrides[j] = mis_pwl(gate, " ".join(instanceLine[:-1]), instanceLine[-1], mainInputATs[l])
+                    if j in answered[l]:
+                        misInstances.append((l, j, instanceLine, overrides, None, None, mainOutputATs[l] + answered[l][j]))
+                    else:
+                        misInstances.append((l, j, instanceLine, overrides, None if path.sweep else firstSim + simulated.index(j),
+                                             conditions[l].get(j), None))
+
+            misParsed = []
+            misDelays = sim_and_read_all(path, misSims, misParsed)
+            if prefixSims:
+                # Full-prefix twins were built in the same order as the replayed sims
+                replayed = [delays for sim, delays in zip(misSims, misDelays) if replays[sim[5]]]
+                replay_check(path, prefixSims, replayed)
+            if path.sweep:
+                # A sweep deck gives one delay per variant, in the order the variants were listed
+                misDelays = [misDelay for sweepDelays in misDelays for misDelay in sweepDelays]
+
+            # Delays with the side input aligned to the main input, table answers in between
+            misDelays = iter(misDelays)
+            alignedDelays = [tableDelay if tableDelay is not None else next(misDelays) for *instance, tableDelay in misInstances]
+            skews = [(0.0, misDelay) for misDelay in alignedDelays]
+            if path.skewWindow:
+                # Side inputs whose aligned run failed aren't searched
+                searched = [idx for idx, misDelay in enumerate(alignedDelays) if misDelay is not None]
+                found = skew_search(path, gate, [(misInstances[idx][0], misInstances[idx][1], alignedDelays[idx]) for idx in searched],
+                                    worstCases, replays, mainInputATs, stageNOutput)
+                for idx, skew in zip(searched, found):
+                    skews[idx] = skew
+
+            # Reduce in the same order as the testbenches were built
+            wcInstances = [None, None]
+            # Every branch's side inputs with their switching override and impact, for the subset search
+            singles = [[], []]
+            for (l, j, instanceLine, overrides, simIdx, misConditions, tableDelay), alignedDelay, (skew, misDelay) in zip(misInstances, alignedDelays, skews):
+                # Characterize the tables with every side input that was measured aligned
+                if misConditions and alignedDelay is not None and tableDelay is None:
+                    path.tables.add(*misConditions, float(alignedDelay) - float(mainOutputATs[l]))
+                    path.tablePoints += 1
+                if skew:
+                    # The winner's deck and the next stages switch the side input at its worst skew
+                    overrides = dict(overrides)
+                    overrides[j] = mis_pwl(gate, " ".join(instanceLine[:-1]), instanceLine[-1], mainInputATs[l], skew)
+                    simIdx = None
+
+                if misDelay is None:
+                    print("MIS_Impact at " + instanceLine[1] + ": failed")
+                    continue
+
+                # Append voltage data to dictionary
+                simData[instanceLine[1]].extend(instanceLine[-2:])
+
+                impact = float(misDelay) - float(mainOutputATs[l])
+                simData[instanceLine[1]].append(impact)
+                singles[l].append((j, instanceLine, overrides[j], impact))
+                if path.skewWindow:
+                    simData[instanceLine[1]].append(skew)
+                print("MIS_Impact at " + instanceLine[1] + ": " + f"{impact * 1e12:.3f} ps"
+                      + (f" at {skew * 1e12:+.3f} ps skew" if path.skewWindow else "")
+                      + (" (table)" if tableDelay is not None and not skew else ""))
+
+                # track per-gate worst case on the fly
+                impact  = misDelay - mainOutputATs[l]        # signed Δ-delay for this side-input
+
+                # ----- keep the two branches independent -----
+                if l == 0:                # SPEED-UP branch (we want the most-negative impact)
+                    if impact < 0:
+                        if (gate.worstSpeedupImpact is None) or (impact < gate.worstSpeedupImpact):
+                            gate.worstSpeedupImpact = impact
+                            gate.wcSpeedupInstance  = instanceLine[1].replace('/', '')
+                            gate.wcAccSpeedup       = misDelay
+                            wcInstances[l]          = (instanceLine, overrides, simIdx)
+
+                else:                      # SLOW-DOWN branch (we want the most-positive impact)
+                    if impact > 0:
+                        if (gate.worstSlowdownImpact is None) or (impact > gate.worstSlowdownImpact):
+                            gate.worstSlowdownImpact = impact
+                            gate.wcSlowdownInstance  = instanceLine[1].replace('/', '')
+                            gate.wcAccSlowdown       = misDelay
+                            wcInstances[l]           = (instanceLine, overrides, simIdx)
+
+            if path.pruneCheck:
+                prune_check(path, gate, pruned, worstCases, replays, mainInputATs, mainOutputATs, stageNOutput)
+
+            if path.subsets:
+                subset_search(path, gate, singles, wcInstances, misSims, misParsed, worstCases, replays, mainOutputATs, stageNOutput)
+
+            # Remember worst case switching and build the next stage on top of it
+            for l in range(len(worstCases)):
+                if wcInstances[l] is None:
+                    continue
+                instanceLine, worstCases[l], simIdx = wcInstances[l]
+                if path.workspace.scratch:
+                    # Keep the worst-case deck, rebuilt from its overrides when it had no deck of its own
+                    wcSim = misSims[simIdx] if simIdx is not None else \
+                        mis_testbench(path, worstCases[l], " ".join(instanceLine[:-1]), stageNOutput, gate, instanceLine, l, replays[l])
+                    wcSim = path.retriedSims.get(deck_name(path, wcSim), wcSim)
+                    spice_file, log_file = sim_files(path, gate, wcSim[3], wcSim[4], l)
+                    path.workspace.persist(spice_file, wcSim[1], log_file if simIdx is not None else None)
+                if path.replay:
+                    replays[l] = record_replay(path, gate, misParsed[simIdx] if simIdx is not None else {},
+                                               instanceLine, worstCases[l], stageNOutput, l, replays[l])
+            # Nothing of the stage is read again
+            path.workspace.clear()
 
         if gate.worstSpeedupImpact is None:
             gate.wcAccSpeedup = mainOutputATs[0]
         if gate.worstSlowdownImpact is None:
             gate.wcAccSlowdown = mainOutputATs[1]
-        
-        i = gate.endsLine + 1
-        # Remember worst case spice file and append new stage to it next
-        if gate.wcSpeedupInstance:
-            with open("_".join([workingPath, gate.stageNum, "MIS", gate.wcSpeedupInstance, "Speedup", ".sp"]), 'r') as wcFile:
-                worstCases[0] = wcFile.readlines()
+
+    result = {
+        "path":        subcktFile,
+        "corner":      path.cornerName,
+        "stages":      len(gates),
+        "sideInputs":  sum(len(gate.sideInputs) for gate in gates),
+        "originalAT":  originalAT,
+        "speedup":     None,
+        "slowdown":    None,
+        "atWindow":    None,
+        "speedupInstances":  [gate.wcSpeedupInstance for gate in gates if gate.wcSpeedupInstance],
+        "slowdownInstances": [gate.wcSlowdownInstance for gate in gates if gate.wcSlowdownInstance],
+        "cacheHits":   path.cacheHits,
+        "cacheMisses": path.cacheMisses,
+        "replayError": path.replayError,
+        "simsPruned":  path.simsPruned,
+        "coarseSims":  path.coarseSims,
+        "pruneMisses": path.pruneMisses,
+        "tableHits":   path.tableHits,
+        "tablePoints": path.tablePoints,
+        "skewSims":    path.skewSims,
+        "adaptiveError":  path.adaptiveError,
+        "adaptiveReruns": path.adaptiveReruns,
+        "subsetSims":  path.subsetSims,
+        "subsetWins":  path.subsetWins,
+        "simRetries":  path.simRetries,
+        "simFailures": path.simFailures,
+    }
+    if originalAT is not None and (gates[-1].wcAccSpeedup > 0 or gates[-1].wcAccSlowdown < 0):
+
+        finalSpeedup = (originalAT - gates[-1].wcAccSpeedup) * 1e12
+        finalSlowdown = (gates[-1].wcAccSlowdown - originalAT) * 1e12
+
+        print(f"Worst Case Speed-up: {finalSpeedup:.3f} ps")
+        print("When ", end='')
+        for gate in gates:
+            if gate.wcSpeedupInstance:
+                print(gate.wcSpeedupInstance + ", ", end='')
+        print("switch with critical path")
+
+        print(f"Worst Case Slow-down: {finalSlowdown:.3f} ps")
+        print("When ", end='')
+        for gate in gates:
+            if gate.wcSlowdownInstance:
+                print(gate.wcSlowdownInstance + ", ", end='')
+        print("switch with critical path")
+        print(f"AT Window: {gates[-1].wcAccSpeedup * 1e9 + startingOffset:.3f} - {gates[-1].wcAccSlowdown * 1e9 + startingOffset:.3f} ns")
+
+        result["speedup"]  = finalSpeedup
+        result["slowdown"] = finalSlowdown
+        result["atWindow"] = (gates[-1].wcAccSpeedup * 1e9 + startingOffset, gates[-1].wcAccSlowdown * 1e9 + startingOffset)
+
+        # for lst in list(simData.values()):
+        #     print(lst)
+
+        # for gate in gates:
+        #     if gate.worstImpact:
+        #         print(gate.stageNum + ": " + str(gate.worstImpact))
+    else:
+        print("No side inputs in path")
+    if path.cache:
+        print(f"Simulation cache: {path.cacheHits} hits, {path.cacheMisses} misses")
+    if path.prune:
+        print(f"Pruning: {path.simsPruned} side-input simulations skipped for {path.coarseSims} coarse ones"
+              + (f", {path.pruneMisses} missed winners" if path.pruneCheck else ""))
+    if path.adaptive:
+        print(f"Adaptive transient: {path.adaptiveReruns} decks rerun with the path's transient"
+              + (f", largest deviation from the fixed-step run {path.adaptiveError * 1e12:.3f} ps" if path.adaptiveError is not None else ""))
+    if path.skewWindow:
+        print(f"Skew search: {path.skewSims} skews simulated")
+    if path.subsets:
+        print(f"Subset search: {path.subsetSims} subsets simulated, {path.subsetWins} worst cases from a subset")
+    if path.tables:
+        print(f"MIS tables: {path.tableHits} side inputs answered, {path.tablePoints} points added")
+    if path.replayError is not None:
+        print(f"Replay check: {path.replayError * 1e12:.3f} ps largest deviation from the full prefix")
+    if path.simRetries or path.simFailures:
+        print(f"Simulation failures: {path.simRetries} retries, {len(path.simFailures)} decks failed every retry")
+        for failure in path.simFailures:
+            print("  " + failure)
+    return result
+
+
+# Nets to ignore
+criticalDefaults = ["/VGND", "/VNB", "/VPB", "/VPWR"]
+
+modelLibrary = str(os.path.expanduser("~")) + '/.volare/sky130A/libs.tech/ngspice/sky130.lib.spice'
+models = '.lib "' + modelLibrary + '" tt\n'
+cellLibrary = '.include "' + str(os.path.expanduser("~")) + '/.volare/sky130A/libs.ref/sky130_fd_sc_hd/spice/sky130_fd_sc_hd.spice"\n'
+includes = {".option noaskquit\n", models, cellLibrary}
+
+# ngspice messages of a run that was aborted
+convergencePattern = re.compile(r"timestep too small|simulation\(s\) aborted", re.IGNORECASE)
+
+# Options each retry of a failed simulation runs with, and the factor it scales the maximum timestep by
+simRelaxations = [(".option gmin=1e-10 reltol=5e-3 itl4=100\n", 1.0),
+                  (".option gmin=1e-10 reltol=5e-3 itl4=100 method=gear\n", 0.5)]
+
+# Coarse ranking simulations for --prune stretch both timesteps by this
+coarseFactor = 10
+
+# Adaptive transients resolve the fastest edge in slewSteps steps, never coarser than adaptiveMaxStep
+slewSteps = 10
+adaptiveMaxStep = 1e-11
+
+cacheDir = os.path.join(os.path.expanduser("~"), ".cache", "222b_MIS")
+cacheMB = 512
+
+
+def parse_corners(spec):
+    # "tt,ss:1.6:100,ff:1.95:-40", each a model corner with optional supply volts and temperature in C
+    corners = []
+    for field in spec.split(","):
+        parts = field.strip().split(":")
+        try:
+            if not parts[0] or len(parts) > 3:
+                raise ValueError
+            vdd = float(parts[1]) if len(parts) > 1 and parts[1] else None
+            temp = float(parts[2]) if len(parts) > 2 and parts[2] else None
+        except ValueError:
+            print("Error: corner " + field + " is not lib[:vdd[:temp]]")
+            sys.exit(1)
+        corners.append((parts[0], vdd, temp))
+    return corners
+
+def corner_name(corner):
+    lib, vdd, temp = corner
+    return lib + (f"_{vdd:g}V" if vdd is not None else "") + (f"_{temp:g}C" if temp is not None else "")
+
+def corner_models(corner):
+    # Model library section, and the temperature when the corner sets one
+    lib, vdd, temp = corner
+    return '.lib "' + modelLibrary + '" ' + lib + "\n" + (f".temp {temp:g}\n" if temp is not None else "")
+
+def corner_supply(lines, netlist, vdd):
+    # Netlist lines with every gate source and stimulus level at the netlist's supply moved to vdd
+    nominal = next((spice_number(lines[idx].split()[-1]) for sources in netlist.sourceLines.values() for idx in sources
+                    if lines[idx].split()[1].endswith("/VPWR")), None)
+    if nominal is None:
+        return lines
+    lines = list(lines)
+    for sources in netlist.sourceLines.values():
+        for idx in sources:
+            tokens = lines[idx].split()
+            if len(tokens) == 4 and abs(spice_number(tokens[3]) - nominal) < 1e-9:
+                lines[idx] = " ".join(tokens[:3] + [f"{vdd:g}"]) + "\n"
+    for idx in range(netlist.pwlLine + 1, netlist.pwlLine + 4):
+        tokens = lines[idx][1:].split()
+        if len(tokens) == 2 and abs(float(tokens[1]) - nominal) < 1e-9:
+            lines[idx] = f"+{tokens[0]} {vdd:.3e}\n"
+    return lines
+
+def corner_envelope(results):
+    # Earliest and latest arrival over the corners' AT windows, and the corners setting them
+    windows = [(result["atWindow"], result["corner"]) for result in results if result.get("atWindow")]
+    if not windows:
+        return None
+    early = min(windows, key=lambda window: window[0][0])
+    late = max(windows, key=lambda window: window[0][1])
+    return early[0][0], late[0][1], early[1], late[1]
+
+def spice_number(token):
+    # SPICE value with an optional scale suffix, 1.5f or 1.5e-15
+    m = re.match(r"^([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[tgkmunpf])?", token.lower())
+    if not m:
+        return 0.0
+    scales = {"t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3, "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15}
+    return float(m.group(1)) * scales.get(m.group(2), 1.0)
+
+def option_value(name, default, cast):
+    if name in sys.argv:
+        idx = sys.argv.index(name)
+        if idx + 1 < len(sys.argv):
+            return cast(sys.argv[idx + 1])
+        print("Error: " + name + " token found, but no value followed.")
+        sys.exit(1)
+    return default
+
+# Analysis modes of pathData taken from the command line by every entry point: flag, keyword and
+# the type of its value, None for a flag without one
+pathOptions = [
+    ("--sweep",           "sweep",             None),
+    ("--replay",          "replay",            None),
+    ("--replay-check",    "replayCheck",       None),
+    ("--raw",             "raw",               None),
+    ("--prune",           "prune",             int),
+    ("--prune-margin",    "pruneMargin",       float),
+    ("--prune-check",     "pruneCheck",        None),
+    ("--skew-window",     "skewWindow",        float),
+    ("--skew-budget",     "skewBudget",        int),
+    ("--adaptive",        "adaptive",          None),
+    ("--adaptive-margin", "adaptiveMargin",    float),
+    ("--adaptive-check",  "adaptiveCheck",     None),
+    ("--adaptive-tol",    "adaptiveTolerance", float),
+    ("--scratch",         "scratchDir",        str),
+    ("--subsets",         "subsets",           int),
+    ("--subset-beam",     "subsetBeam",        int),
+    ("--sim-timeout",     "simTimeout",        float),
+    ("--sim-retries",     "retries",           int),
+]
+
+def path_options():
+    # pathData keyword arguments of the modes on the command line, pathData's defaults for the
+    # others, checked before any path is analyzed
+    defaults = inspect.signature(pathData).parameters
+    options = {name: flag in sys.argv if cast is None else option_value(flag, defaults[name].default, cast)
+               for flag, name, cast in pathOptions}
+    if options["raw"] and np is None:
+        print("Error: --raw needs numpy")
+        sys.exit(1)
+    if options["retries"] > len(simRelaxations):
+        print(f"Error: --sim-retries takes at most {len(simRelaxations)}, one retry per relaxed option set")
+        sys.exit(1)
+    if options["skewWindow"] and options["skewBudget"] < 4:
+        print("Error: --skew-budget needs at least 4 simulations for the bracketing grid")
+        sys.exit(1)
+    return options
+
+def main():
+    subcktFile = sys.argv[1]
+
+    verbose = False
+    jobs = 1
+    startingOffset = 0.0
+
+    # Clean Method
+    if "--clean" in sys.argv:
+        subprocess.run("rm subcircuits/*IS*", shell=True, check=True)
+        sys.exit()
+
+    # verbose mode
+    if "--v" in sys.argv:
+        verbose = True
+
+    if "--so" in sys.argv:
+        # Find the index of '--so'
+        so_index = sys.argv.index('--so')
+        # Check if there's an element after '--so'
+        if so_index + 1 < len(sys.argv):
+            # Try to convert it to a number
+            number_str = sys.argv[so_index + 1]
+            startingOffset = float(number_str) # Or float(number_str)
+            print(str("Initial time: " + str(startingOffset)))
         else:
-            pass
-        if gate.wcSlowdownInstance:
-            with open("_".join([workingPath, gate.stageNum, "MIS", gate.wcSlowdownInstance, "Slowdown", ".sp"]), 'r') as wcFile:
-                worstCases[1] = wcFile.readlines()
+            print("Error: --so token found, but no number followed.")
+            sys.exit(1)
+
+    # Number of MIS simulations to run concurrently, 0 uses every core
+    if "--jobs" in sys.argv:
+        jobs_index = sys.argv.index('--jobs')
+        if jobs_index + 1 < len(sys.argv):
+            jobs = int(sys.argv[jobs_index + 1]) or os.cpu_count()
         else:
-            pass
-    else:
-        i += 1
-if gates[-1].wcAccSpeedup > 0 or gates[-1].wcAccSlowdown < 0:
+            print("Error: --jobs token found, but no number followed.")
+            sys.exit(1)
 
-    finalSpeedup = (originalAT - gates[-1].wcAccSpeedup) * 1e12
-    finalSlowdown = (gates[-1].wcAccSlowdown - originalAT) * 1e12
+    # Simulation results are reused from the cache unless --no-cache
+    cache = None
+    if "--no-cache" not in sys.argv:
+        cache = simCache(option_value("--cache", cacheDir, str), option_value("--cache-size", cacheMB, float) * 1e6)
 
-    print(f"Worst Case Speed-up: {finalSpeedup:.3f} ps")
-    print("When ", end='')
-    for gate in gates:
-        if gate.wcSpeedupInstance:
-            print(gate.wcSpeedupInstance + ", ", end='')
-    print("switch with critical path")
+    # Analysis modes, checked before anything is simulated
+    options = path_options()
 
-    print(f"Worst Case Slow-down: {finalSlowdown:.3f} ps")
-    print("When ", end='')
-    for gate in gates:
-        if gate.wcSlowdownInstance:
-            print(gate.wcSlowdownInstance + ", ", end='')
-    print("switch with critical path")
-    print(f"AT Window: {gates[-1].wcAccSpeedup * 1e9 + startingOffset:.3f} - {gates[-1].wcAccSlowdown * 1e9 + startingOffset:.3f} ns")
+    # Keep warm ngspice sessions instead of starting one per simulation
+    sessions = sessionPool(jobs) if "--sessions" in sys.argv else None
 
+    # Answer side inputs from MIS characterization tables shared across paths
+    tableDir = option_value("--mis-tables", None, str)
+    tables = misTable(tableDir) if tableDir else None
 
-    # for lst in list(simData.values()):
-    #     print(lst)
+    # Analyze the path at every model corner, supply and temperature listed
+    corners = parse_corners(option_value("--corners", None, str)) if "--corners" in sys.argv else [None]
 
-    # for gate in gates:
-    #     if gate.worstImpact:
-    #         print(gate.stageNum + ": " + str(gate.worstImpact))
-else:
-    print("No side inputs in path")
+    # Trace every simulation to a Chrome trace file
+    traceFile = option_value("--profile", None, str)
+    profile = simProfile() if traceFile else None
 
+    # Otherwise take spice file from command line
+    results = []
+    try:
+        if len(corners) == 1:
+            results.append(analyze_path(subcktFile, startingOffset, verbose=verbose, jobs=jobs, cache=cache, sessions=sessions,
+                                        profile=profile, tables=tables, corner=corners[0], **options))
+        else:
+            # Corners are analyzed together, sharing the --jobs ngspice slots, so one corner's
+            # single-deck steps leave the slots to the others. Reports are printed in corner order
+            simSlots = threading.BoundedSemaphore(jobs)
+            output = threadOutput(sys.stdout)
+            reports = [io.StringIO() for corner in corners]
+            def analyze_corner(idx):
+                output.buffers[threading.get_ident()] = reports[idx]
+                try:
+                    return analyze_path(subcktFile, startingOffset, verbose=verbose, jobs=jobs, simSlots=simSlots, cache=cache,
+                                        sessions=sessions, profile=profile, tables=tables, corner=corners[idx], **options)
+                finally:
+                    del output.buffers[threading.get_ident()]
+            sys.stdout = output
+            try:
+                with ThreadPoolExecutor(max_workers=len(corners)) as pool:
+                    futures = [pool.submit(analyze_corner, idx) for idx in range(len(corners))]
+            finally:
+                sys.stdout = output.console
+            for report, future in zip(reports, futures):
+                sys.stdout.write(report.getvalue())
+                results.append(future.result())
+    except RuntimeError as e:
+        print("Error: " + str(e))
+        sys.exit(1)
+    finally:
+        if sessions:
+            sessions.close()
+    if corners[0]:
+        print()
+        for result in results:
+            window = result["atWindow"]
+            print(f"{result['corner']}: " + (f"AT Window {window[0]:.3f} - {window[1]:.3f} ns" if window else "no side inputs"))
+        envelope = corner_envelope(results)
+        if envelope:
+            print(f"Corner envelope: {envelope[0]:.3f} - {envelope[1]:.3f} ns (earliest at {envelope[2]}, latest at {envelope[3]})")
+    if profile:
+        print_profile(profile.write(traceFile, option_value("--profile-top", 10, int)), traceFile)
+
+
+if __name__ == "__main__":
+    main()
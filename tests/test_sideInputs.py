@@ -0,0 +1,183 @@
+import os
+import sys
+import math
+import bisect
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sideInputs
+from sideInputs import simCache, compress_wave, misTable
+
+
+deck = ["* path_0 stage 2\n", ".tran 1p 2n 0 1e-12\n", ".print tran v(u2/a)\n", ".end\n"]
+
+
+def test_cache_key_distinguishes_parse_modes(tmp_path):
+    cache = simCache(str(tmp_path), 1e6)
+    keys = {cache.key(deck, mode) for mode in ("", "waves", "raw", "raw waves")}
+    assert len(keys) == 4
+    assert cache.key(deck, "waves") == cache.key(list(deck), "waves")
+
+
+def test_cache_keeps_waves(tmp_path):
+    cache = simCache(str(tmp_path), 1e6)
+    delays = {"t_misu1b_delay": (None, 1.5e-10), "v(u2/a)": [[0.0, 0.0], [1e-10, 1.1]]}
+    cache.put(cache.key(deck, "waves"), delays)
+    assert cache.get(cache.key(deck)) is None
+    entry = cache.get(cache.key(deck, "waves"))
+    assert entry["t_misu1b_delay"] == (None, 1.5e-10)
+    assert [list(point) for point in entry["v(u2/a)"]] == delays["v(u2/a)"]
+
+
+def pwl_deviation(points, kept):
+    # Largest distance of a recorded point from the PWL through the kept ones
+    times = [t for t, v in kept]
+    deviation = 0.0
+    for t, v in points:
+        idx = min(max(bisect.bisect_right(times, t), 1), len(kept) - 1)
+        (t0, v0), (t1, v1) = kept[idx - 1], kept[idx]
+        deviation = max(deviation, abs(v - v0 - (v1 - v0) * (t - t0) / (t1 - t0)))
+    return deviation
+
+
+def test_compress_wave_within_tolerance():
+    waves = [
+        [[i * 1e-12, 0.9 + 0.9 * math.tanh((i * 1e-12 - 1e-9) / 2e-11)] for i in range(2000)],
+        [[i * 1e-12, 1.8 * math.exp(-i * 1e-12 / 3e-10)] for i in range(2000)],
+        [[i * 1e-13, 1.8 * (1 - math.exp(-i * 1e-13 / 3e-11))] for i in range(2000)],
+    ]
+    for points in waves:
+        kept = compress_wave(points)
+        assert kept[0] == points[0] and kept[-1] == points[-1]
+        assert len(kept) < len(points) // 10
+        assert pwl_deviation(points, kept) <= 1e-3
+        assert pwl_deviation(points, compress_wave(points, 1e-2)) <= 1e-2
+
+
+def test_compress_wave_drops_repeated_timepoints():
+    points = [[0.0, 0.0], [1e-12, 0.5], [1e-12, 0.6], [2e-12, 1.8], [3e-12, 1.8]]
+    assert compress_wave(points) == [[0.0, 0.0], [1e-12, 0.5], [2e-12, 1.8], [3e-12, 1.8]]
+
+
+def test_cache_trims_least_recently_used(tmp_path):
+    cache = simCache(str(tmp_path), 600)
+    keys = [cache.key(deck + [f"* variant {n}\n"]) for n in range(8)]
+    for n, key in enumerate(keys):
+        cache.put(key, {"t_misu1b_delay": (None, n * 1e-12), "pad": [0.0] * 8})
+        os.utime(os.path.join(str(tmp_path), key + ".json"), ns=(n * 10**9, n * 10**9))
+    assert cache.size <= 600
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1])["t_misu1b_delay"] == (None, 7e-12)
+
+
+def test_mis_table_interpolates_between_points(tmp_path):
+    tables = misTable(str(tmp_path))
+    key = tables.key(["sky130_fd_sc_hd__nand2_1", "A", "rise", "B", "fall"])
+    assert key != tables.key(["sky130_fd_sc_hd__nand2_1", "A", "rise", "B", "rise"])
+    tables.add(key, (20e-12, 2e-15, -4e-12), -6e-12)
+    tables.add(key, (20e-12, 2e-15, 4e-12), -2e-12)
+    # A characterized point answers for itself, one between two points is interpolated
+    assert tables.lookup(key, (20e-12, 2e-15, -4e-12)) == -6e-12
+    assert abs(tables.lookup(key, (20e-12, 2e-15, 0.0)) + 4e-12) < 1e-18
+    assert -6e-12 < tables.lookup(key, (20e-12, 2e-15, -1e-12)) < -4e-12
+    # Beyond the outermost point, or further than a step from any, is outside the characterized range
+    assert tables.lookup(key, (20e-12, 2e-15, 6e-12)) is None
+    assert tables.lookup(key, (30e-12, 2e-15, 0.0)) is None
+    assert tables.lookup(tables.key(["other"]), (20e-12, 2e-15, 0.0)) is None
+
+
+def test_mis_table_shares_points_between_instances(tmp_path):
+    tables = misTable(str(tmp_path))
+    other = misTable(str(tmp_path))
+    key = tables.key(["sky130_fd_sc_hd__nor2_1", "A", "fall", "B", "rise"])
+    assert other.lookup(key, (20e-12, 2e-15, 0.0)) is None
+    tables.add(key, (20e-12, 2e-15, 0.0), 3e-12)
+    assert other.lookup(key, (20e-12, 2e-15, 0.0)) == 3e-12
+    # A lookup within tolerance of a point needs no bracketing neighbours
+    assert other.lookup(key, (20.2e-12, 2e-15, 0.0)) == 3e-12
+
+
+def skew_delays(monkeypatch, delay):
+    # Stand in for skew_round, answering every (search, skew) point with delay(l, skew) and
+    # counting the skews simulated per search
+    simulated = {}
+    def fake_round(path, gate, searches, decks, names, tried, *args):
+        for points in decks:
+            for idx, skew in points:
+                # Like skew_round, a failed measure (None) isn't recorded
+                if delay(searches[idx][0], skew) is not None:
+                    tried[idx][skew] = delay(searches[idx][0], skew)
+                simulated[idx] = simulated.get(idx, 0) + 1
+    monkeypatch.setattr(sideInputs, "skew_round", fake_round)
+    return simulated
+
+
+def run_skew_search(searches, budget, window=20e-12, mainInputAT=100e-12):
+    path = SimpleNamespace(skewWindow=window, skewBudget=budget, lines=["x1 u1/B 0 1.8\n", "x1 u2/B 0 1.8\n"])
+    gate = SimpleNamespace(simTime=2e-9)
+    return sideInputs.skew_search(path, gate, searches, [{}, {}], [None, None], [mainInputAT, mainInputAT], "u3/Y")
+
+
+def test_skew_search_narrows_the_bracket(monkeypatch):
+    # Speedup wants the earliest output, Slowdown the latest
+    def delay(l, skew):
+        return 100e-12 + (skew - 7e-12) ** 2 * 1e10 if l == 0 else 120e-12 - (skew + 5e-12) ** 2 * 1e10
+    simulated = skew_delays(monkeypatch, delay)
+    searches = [(0, 0, delay(0, 0.0)), (1, 1, delay(1, 0.0))]
+    (speedSkew, speedDelay), (slowSkew, slowDelay) = run_skew_search(searches, 12)
+    assert abs(speedSkew - 7e-12) < 1e-12 and speedDelay == delay(0, speedSkew)
+    assert abs(slowSkew + 5e-12) < 1e-12 and slowDelay == delay(1, slowSkew)
+    assert speedDelay < searches[0][2] and slowDelay > searches[1][2]
+    assert all(count <= 12 for count in simulated.values())
+
+
+def test_skew_search_stays_in_window(monkeypatch):
+    # Monotonic impacts end at the window's edges, clipped to 0.9 of the main input's ramp
+    simulated = skew_delays(monkeypatch, lambda l, skew: 100e-12 + skew)
+    (speedSkew, speedDelay), (slowSkew, slowDelay) = run_skew_search([(0, 0, 100e-12), (1, 1, 100e-12)], 8, 50e-12, 40e-12)
+    assert speedSkew == -0.9 * 40e-12 and slowSkew == 50e-12
+    assert simulated == {0: 8, 1: 8}
+
+
+def test_skew_search_ignores_failed_measures(monkeypatch):
+    # A skew whose measure failed reads as None and is never picked
+    skew_delays(monkeypatch, lambda l, skew: None if skew < 0 else 100e-12 - skew)
+    [(skew, delay)] = run_skew_search([(0, 0, 100e-12)], 8)
+    assert skew == 20e-12 and delay == 100e-12 - 20e-12
+
+
+def test_header_includes_the_paths_own_cells(tmp_path):
+    # write_path_spice includes path_1.subckt in every deck, each path must read its own
+    sys.path.insert(0, os.path.join(os.path.dirname(sideInputs.__file__), "bench"))
+    from genPaths import write_paths
+    subcktFile = write_paths(str(tmp_path), 3, 3, 2)[2]
+    path = sideInputs.pathData(subcktFile)
+    path.workspace.close()
+    includes = [line for line in path.header if "subckt" in line]
+    assert includes == ['.include "' + os.path.splitext(subcktFile)[0] + '.subckt"\n']
+
+
+def test_cache_identity_follows_included_files(tmp_path):
+    cache = simCache(str(tmp_path / "cache"), 1e6)
+    cells = tmp_path / "path_0.subckt"
+    cells.write_text("* cells\n")
+    includeLines = ['.include "%s"\n' % cells, '.lib "%s" tt\n' % (tmp_path / "missing.lib")]
+    identity = simCache.identity(includeLines)
+    assert str(cells) in identity and "missing" in identity
+    cells.write_text("* other cells\n")
+    assert simCache.identity(includeLines) != identity
+    assert cache.key(deck, "", identity) != cache.key(deck, "", simCache.identity(includeLines))
+
+
+def test_path_options_parse_modes_with_pathdata_defaults(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["batchPaths.py", "tmp_output", "--sweep", "--prune", "3", "--adaptive-tol", "0.2"])
+    options = sideInputs.path_options()
+    assert options["sweep"] and not options["replay"]
+    assert options["prune"] == 3 and options["adaptiveTolerance"] == 0.2
+    assert options["skewBudget"] == 8 and options["retries"] == 2 and options["scratchDir"] is None
+    monkeypatch.setattr(sys, "argv", ["sideInputs.py", "path_0.sp", "--sim-retries", "9"])
+    with pytest.raises(SystemExit):
+        sideInputs.path_options()